@@ -13,9 +13,13 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 import os
 from pathlib import Path
 
+from dotenv import load_dotenv
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+load_dotenv(BASE_DIR / '.env')  # 讀取 .env 檔案，每個 process 一次
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
@@ -49,6 +53,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -57,8 +62,14 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'core', 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # 已編譯的模板留在記憶體中；開發模式下 runserver 偵測到模板變更會自動清除
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -79,6 +90,20 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'timeout': 20,  # 背景 worker 與網頁同時寫入時等待鎖
+        },
+    }
+}
+
+
+# Cache
+# 頁面與模板片段快取；多個 process 部署時可改為 Redis / Memcached
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'english-quiz',
     }
 }
 
@@ -130,3 +155,15 @@ ALLOWED_HOSTS = ['*']
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 LOGIN_URL = '/login/'
+
+# 舊 TestRecord 的封存目錄（manage.py archive_records）
+RECORD_ARCHIVE_DIR = BASE_DIR / 'archive' / 'testrecords'
+
+# 相似題推薦的 TF-IDF 索引檔（manage.py build_recommender）
+RECOMMENDER_INDEX_PATH = BASE_DIR / 'archive' / 'recommender.pkl'
+
+# 請求 profiling（管理員限定）：關閉時 middleware 不會載入
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED') == '1'
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_INTERVAL = 0.001  # 取樣間隔（秒）
+PROFILING_DIR = BASE_DIR / 'profiles'
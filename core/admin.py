@@ -2,13 +2,58 @@ from django.contrib import admin
 
 # Register your models here.
 from django.contrib import admin
-from .models import User, Question, Favorite, TestRecord, WeakTopic, Explanation, GptLog, Feedback
+from .services.search_service import get_search_index
+from .models import User, Question, Favorite, TestRecord, WeakTopic, Explanation, GptLog, Feedback, ReviewSchedule, Task, ExamPaper, QuestionQuality, Passage
 
 admin.site.register(User)
-admin.site.register(Question)
+
+
+class QuestionAdmin(admin.ModelAdmin):
+    list_display = ('id', '__str__', 'topic', 'is_gpt_generated', 'created_dt')
+    list_filter = ('topic', 'is_gpt_generated')
+    search_fields = ('content',)  # 顯示搜尋框；實際查詢走全文索引
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        # 側欄篩選先交給索引，否則取前 1000 筆後再篩選，符合條件的題目會漏掉
+        topic = request.GET.get('topic') or None
+        is_gpt = {'1': True, '0': False}.get(request.GET.get('is_gpt_generated__exact'))
+        hits = get_search_index().search(search_term, topic=topic, is_gpt=is_gpt, limit=1000)
+        ids = [qid for qid, _ in hits]
+        return queryset.filter(id__in=ids), False
+
+
+admin.site.register(Question, QuestionAdmin)
 admin.site.register(Favorite)
 admin.site.register(TestRecord)
 admin.site.register(WeakTopic)
 admin.site.register(Explanation)
 admin.site.register(GptLog)
-admin.site.register(Feedback)
\ No newline at end of file
+admin.site.register(Feedback)
+admin.site.register(QuestionQuality)
+admin.site.register(Passage)
+admin.site.register(ReviewSchedule)
+admin.site.register(Task)
+
+
+class ExamPaperAdmin(admin.ModelAdmin):
+    list_display = ('title', 'topic', 'count', 'version', 'is_published', 'published_at')
+    readonly_fields = ('question_ids', 'seed', 'version', 'is_published', 'published_at')
+    actions = ['publish_papers', 'unpublish_papers']
+
+    @admin.action(description="組卷並發布新版本")
+    def publish_papers(self, request, queryset):
+        for paper in queryset:
+            paper.publish()
+        self.message_user(request, f"已發布 {queryset.count()} 份考卷")
+
+    @admin.action(description="取消發布")
+    def unpublish_papers(self, request, queryset):
+        # 逐份 save 才會觸發 signal 清除快取
+        for paper in queryset.filter(is_published=True):
+            paper.unpublish()
+        self.message_user(request, "已取消發布")
+
+
+admin.site.register(ExamPaper, ExamPaperAdmin)
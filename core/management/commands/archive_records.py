@@ -0,0 +1,85 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import ArchivedAnswerStat, Question, TestRecord, User
+from core.services.archive_service import ColumnarWriter, get_archive
+
+
+class Command(BaseCommand):
+    help = "把超過指定天數的 TestRecord 按月封存成壓縮欄式檔案，並從資料表刪除"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, help="天數")
+        parser.add_argument('--chunk-size', type=int, default=50000, help="每個封存檔最多的列數")
+        parser.add_argument('--delete-batch', type=int, default=2000)
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--rebuild-stats', action='store_true', help="從既有封存檔重算每人每題彙總（升級後跑一次）")
+
+    def handle(self, *args, **options):
+        if options['rebuild_stats']:
+            return self.rebuild_stats()
+        if options['older_than'] is None:
+            raise CommandError("請指定 --older-than")
+
+        cutoff = timezone.now() - timedelta(days=options['older_than'])
+        archive = get_archive()
+        writer = ColumnarWriter()
+        qs = TestRecord.objects.filter(timestamp__lt=cutoff).order_by('id')
+
+        if options['dry_run']:
+            self.stdout.write(f"將封存 {qs.count()} 筆（{cutoff:%Y-%m-%d} 以前）")
+            return
+
+        last_id = 0
+        archived = files = 0
+        while True:
+            rows = list(
+                qs.filter(id__gt=last_id).values_list(
+                    'id', 'user_id', 'question_id', 'is_correct', 'selected_option', 'timestamp', 'test_result_id'
+                )[:options['chunk_size']]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            by_month = defaultdict(list)
+            for row in rows:
+                by_month[(row[5].year, row[5].month)].append(row)
+            for (year, month), month_rows in by_month.items():
+                writer.write(archive.partition_path(year, month, month_rows[0][0]), month_rows)
+                files += 1
+
+            # 檔案寫入完成後才累加彙總並分批刪除熱資料；兩者同一交易，中斷重跑不會重複計數
+            ids = [row[0] for row in rows]
+            with transaction.atomic():
+                ArchivedAnswerStat.add_counts(ArchivedAnswerStat.count_rows((row[1], row[2], row[3]) for row in rows))
+                for i in range(0, len(ids), options['delete_batch']):
+                    TestRecord.objects.filter(id__in=ids[i:i + options['delete_batch']]).delete()
+            archived += len(rows)
+            self.stdout.write(f"已封存 {archived} 筆")
+
+        self.stdout.write(self.style.SUCCESS(f"完成：{archived} 筆，{files} 個檔案 → {archive.root}"))
+
+    def rebuild_stats(self):
+        """封存資料不會再變，整個目錄掃一次即可重建"""
+        archive = get_archive()
+        counts = {}
+        for data in archive.scan(['user_id', 'question_id', 'is_correct']):
+            for key, (correct, total) in ArchivedAnswerStat.count_rows(
+                zip(data['user_id'], data['question_id'], data['is_correct'])
+            ).items():
+                entry = counts.setdefault(key, [0, 0])
+                entry[0] += correct
+                entry[1] += total
+        # 封存後才刪掉的帳號或題目不再統計
+        users = set(User.objects.values_list('id', flat=True))
+        questions = set(Question.objects.values_list('id', flat=True))
+        counts = {key: value for key, value in counts.items() if key[0] in users and key[1] in questions}
+        with transaction.atomic():
+            ArchivedAnswerStat.objects.all().delete()
+            ArchivedAnswerStat.add_counts(counts)
+        self.stdout.write(self.style.SUCCESS(f"重建完成：{len(counts)} 筆每人每題彙總"))
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+
+from core.models import TestRecord, TestSession
+
+
+class Command(BaseCommand):
+    help = "由既有 TestRecord 分批建立 TestSession 摘要（已存在的測驗會略過）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--batch-size', type=int, default=500, help="每次 bulk_create 的筆數")
+
+    def handle(self, *args, **options):
+        rows = (
+            TestRecord.objects.order_by('user_id', 'test_result_id', 'timestamp')
+            .values_list('user_id', 'test_result_id', 'is_correct', 'timestamp')
+            .iterator(chunk_size=options['chunk_size'])
+        )
+
+        # 依 (user, test_result_id) 排序後逐組累加，記憶體只保留一組與一個批次
+        batch = []
+        created = 0
+        current = None
+        for user_id, test_result_id, is_correct, timestamp in rows:
+            key = (user_id, test_result_id)
+            if current is None or key != (current.user_id, current.test_result_id):
+                if current is not None:
+                    batch.append(current)
+                current = TestSession(
+                    user_id=user_id,
+                    test_result_id=test_result_id,
+                    config={'backfilled': True},
+                    started_at=timestamp,
+                    finished_at=timestamp,
+                )
+            current.answered_count += 1
+            current.question_count += 1
+            current.correct_count += int(is_correct)
+            current.finished_at = timestamp
+
+            if len(batch) >= options['batch_size']:
+                created += self._flush(batch)
+                batch = []
+
+        if current is not None:
+            batch.append(current)
+        created += self._flush(batch)
+        self.stdout.write(self.style.SUCCESS(f"處理完成，共 {created} 筆測驗（已存在的摘要不會覆寫）"))
+
+    def _flush(self, batch):
+        if not batch:
+            return 0
+        TestSession.objects.bulk_create(batch, ignore_conflicts=True)
+        return len(batch)
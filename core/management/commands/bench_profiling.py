@@ -0,0 +1,59 @@
+import secrets
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+from core.models import User
+
+
+class Command(BaseCommand):
+    help = "比較 profiling middleware 關閉 / 啟用但未觸發 / 實際 profiling 時的請求延遲"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--path', default='/start-test/')
+
+    def handle(self, *args, **options):
+        without = [m for m in settings.MIDDLEWARE if m != 'core.middleware.ProfilingMiddleware']
+
+        cases = [
+            ("不安裝 middleware", {'MIDDLEWARE': without}, {}),
+            ("已安裝但關閉", {'PROFILING_ENABLED': False}, {}),
+            ("啟用、未帶旗標", {'PROFILING_ENABLED': True, 'PROFILING_SAMPLE_RATE': 0.0}, {}),
+            ("啟用並 profiling", {'PROFILING_ENABLED': True, 'PROFILING_DIR': settings.PROFILING_DIR / 'bench'},
+             {'HTTP_X_PROFILE': '1'}),
+        ]
+        # 舊版本會留下固定密碼的 bench_profiler 管理員，順手清掉
+        User.objects.filter(username='bench_profiler', password='x').delete()
+        # 暫時的管理員帳號，密碼隨機且結束後刪除（登入以明文比對密碼，不能留下已知密碼的帳號）
+        admin = User.objects.create(
+            username=f'bench_profiler_{secrets.token_hex(4)}', password=secrets.token_urlsafe(32), role='admin'
+        )
+        sessions = []
+        try:
+            baseline = None
+            for label, overrides, headers in cases:
+                with override_settings(**overrides):
+                    client = Client()
+                    session = client.session
+                    session['user_id'] = admin.id
+                    session.save()
+                    sessions.append(session)
+                    client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+                    n = options['requests'] if not headers else max(20, options['requests'] // 10)
+                    client.get(options['path'], **headers)  # 暖機
+                    timings = []
+                    for _ in range(n):
+                        start = time.perf_counter()
+                        client.get(options['path'], **headers)
+                        timings.append((time.perf_counter() - start) * 1000)
+                median = statistics.median(timings)
+                baseline = baseline or median
+                self.stdout.write(f"{label:<16} median {median:7.3f}ms  ({(median / baseline - 1) * 100:+.1f}%)")
+        finally:
+            for session in sessions:
+                session.delete()
+            admin.delete()
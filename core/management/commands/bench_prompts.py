@@ -0,0 +1,83 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models import Question
+from core.services.gpt_service import GPTExplanationService
+from core.services.prompt_builder import PromptBuilder
+
+
+def legacy_prompt(q, a, options):
+    """改版前 GPTExplanationService._build_prompt 的輸出，作為比較基準"""
+    options_text = "\n".join([f"{key}. {value}" for key, value in options.items()])
+    return f"""請說明為什麼下面的英文選擇題中，選項「{a}」是正確或錯誤的，盡可能在100字以內說明每個選項，要在選項前面備註。
+                題目：{q}
+                選項：
+                {options_text}
+                正確答案：{a}
+                請用中文母語的觀點解釋，評斷學生可能錯誤的原因，幫助學生學習。"""
+
+
+class Command(BaseCommand):
+    help = "統計題庫的 prompt / completion token 數（預設只在本機計算，--live 會實際呼叫 API）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=0, help="只取前 N 題")
+        parser.add_argument('--live', type=int, default=0, help="每個題型實際呼叫 API 的題數")
+
+    def handle(self, *args, **options):
+        builder = PromptBuilder()
+        counter = builder.counter
+        self.stdout.write(f"tokenizer：{'tiktoken' if counter.encoder else '估算'}")
+
+        questions = Question.objects.order_by('id').select_related('passage')
+        if options['limit']:
+            questions = questions[:options['limit']]
+
+        stats = {}
+        for q in questions.iterator(chunk_size=500):
+            s = stats.setdefault(q.topic, {'n': 0, 'legacy': 0, 'prompt': 0, 'cap': 0, 'truncated': 0})
+            passage = q.passage.content if q.passage_id else None
+            prompt = builder.build_explanation_prompt(q.content, q.answer, q.options, q.topic, passage)
+            s['n'] += 1
+            s['legacy'] += counter.count(legacy_prompt(q.full_text, q.answer, q.options))
+            s['prompt'] += counter.count(prompt)
+            s['cap'] += builder.budget_for(q.topic)['completion']
+            s['truncated'] += '（中略）' in prompt
+
+        self.stdout.write(f"{'topic':<10}{'n':>7}{'legacy':>10}{'prompt':>10}{'saved':>8}{'max_out':>9}{'trunc':>7}")
+        for topic, s in sorted(stats.items()):
+            n = s['n']
+            self.stdout.write(
+                f"{topic:<10}{n:>7}{s['legacy'] / n:>10.1f}{s['prompt'] / n:>10.1f}"
+                f"{(1 - s['prompt'] / s['legacy']) * 100:>7.1f}%{s['cap'] / n:>9.0f}{s['truncated']:>7}"
+            )
+
+        if options['live']:
+            self._live(builder, options['live'], list(stats))
+
+    def _live(self, builder, per_topic, topics):
+        from core.services.registry import registry
+
+        client = registry.get('gpt_client')
+        service = GPTExplanationService(gpt_client=client, prompt_builder=builder)
+        for topic in sorted(topics):
+            usage = {'prompt_tokens': 0, 'completion_tokens': 0}
+            elapsed = 0.0
+            sample = list(Question.objects.filter(topic=topic).select_related('passage').order_by('id')[:per_topic])
+            for q in sample:
+                passage = q.passage.content if q.passage_id else None
+                prompt = service._build_prompt(q.content, q.answer, q.options, topic, passage)
+                start = time.perf_counter()
+                result = client.complete(prompt, max_tokens=builder.budget_for(topic)['completion'], timeout=service.timeout)
+                elapsed += time.perf_counter() - start
+                if not result.ok:
+                    self.stderr.write(f"[live] Q{q.id} {result.error_type}: {result.error}")
+                    continue
+                for key in usage:
+                    usage[key] += result.usage.get(key, 0)
+            n = len(sample) or 1
+            self.stdout.write(
+                f"[live] {topic:<10} prompt {usage['prompt_tokens'] / n:7.1f}  "
+                f"completion {usage['completion_tokens'] / n:7.1f}  latency {elapsed / n:6.2f}s"
+            )
@@ -0,0 +1,41 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models import Question
+from core.services.search_service import get_search_index, tokenize
+
+
+class Command(BaseCommand):
+    help = "以題庫中的單字量測全文搜尋延遲"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        sample = Question.objects.order_by('?').values_list('content', flat=True)[:200]
+        words = [w for content in sample for w in tokenize(content) if len(w) > 3]
+        if not words:
+            self.stdout.write("題庫是空的")
+            return
+
+        index = get_search_index()
+        index.search(words[0])  # 備援索引第一次搜尋時建立
+
+        timings = []
+        for _ in range(options['queries']):
+            query = " ".join(rng.sample(words, k=min(2, len(words))))
+            topic = rng.choice([None, 'vocab', 'grammar', 'cloze', 'reading'])
+            start = time.perf_counter()
+            index.search(query, topic=topic, limit=20)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        timings.sort()
+        self.stdout.write(
+            f"{type(index).__name__}  questions={Question.objects.count()}  "
+            f"p50={timings[len(timings) // 2]:.2f}ms  p95={timings[int(len(timings) * 0.95)]:.2f}ms  "
+            f"max={timings[-1]:.2f}ms"
+        )
@@ -0,0 +1,66 @@
+import os
+import re
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# 在乾淨的子 process 中量測冷啟動：django.setup、載入 URLconf、第一個與第二個請求
+COLD_START = r"""
+import time
+t0 = time.perf_counter()
+import django
+django.setup()
+t1 = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+t2 = time.perf_counter()
+from django.test import Client
+client = Client()
+client.get('{path}')
+t3 = time.perf_counter()
+client.get('{path}')
+t4 = time.perf_counter()
+import sys
+print(f"setup={{(t1 - t0) * 1000:.1f}} urls={{(t2 - t1) * 1000:.1f}} "
+      f"first={{(t3 - t2) * 1000:.1f}} second={{(t4 - t3) * 1000:.1f}} "
+      f"requests_loaded={{'requests' in sys.modules}} openai_loaded={{'openai' in sys.modules}}")
+"""
+
+IMPORTTIME = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|(\s*)(.+)')
+
+
+class Command(BaseCommand):
+    help = "量測 worker 冷啟動時間（python -X importtime 與第一個請求延遲）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--path', default='/login/')
+        parser.add_argument('--top', type=int, default=10, help="列出載入 core.urls 時最慢的模組")
+
+    def handle(self, *args, **options):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'config.settings')}
+        cwd = str(settings.BASE_DIR)
+
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import django; django.setup(); import core.urls'],
+            capture_output=True, text=True, env=env, cwd=cwd,
+        )
+        rows = []
+        for line in proc.stderr.splitlines():
+            match = IMPORTTIME.match(line)
+            if match:
+                rows.append((int(match.group(2)), match.group(4).strip()))
+        total = next((cumulative for cumulative, name in rows if name == 'core.urls'), 0)
+        self.stdout.write(f"import core.urls（含依賴）: {total / 1000:.1f}ms")
+        for cumulative, name in sorted(rows, reverse=True)[:options['top']]:
+            self.stdout.write(f"  {cumulative / 1000:8.1f}ms  {name}")
+
+        self.stdout.write("冷啟動（每次都是新的 process）：")
+        for _ in range(options['runs']):
+            proc = subprocess.run(
+                [sys.executable, '-c', COLD_START.format(path=options['path'])],
+                capture_output=True, text=True, env=env, cwd=cwd,
+            )
+            self.stdout.write("  " + (proc.stdout.strip() or proc.stderr.strip().splitlines()[-1]))
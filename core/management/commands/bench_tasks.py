@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models import Task
+from core.services.task_queue import TaskWorker, enqueue, task
+
+
+@task('bench_noop')
+def bench_noop(n, sleep=0.0):
+    if sleep:
+        time.sleep(sleep)  # 模擬 GPT 呼叫的等待時間
+    return {'n': n}
+
+
+class Command(BaseCommand):
+    help = "量測背景工作佇列的加入與處理吞吐量"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=500)
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+        parser.add_argument('--sleep', type=float, default=0.01, help="每件工作模擬的 I/O 秒數")
+
+    def handle(self, *args, **options):
+        for workers in options['workers']:
+            Task.objects.filter(name='bench_noop').delete()
+
+            start = time.perf_counter()
+            for i in range(options['tasks']):
+                enqueue('bench_noop', {'n': i, 'sleep': options['sleep']}, dedup_key=f'bench:{i}')
+            enqueue_time = time.perf_counter() - start
+
+            # 重複加入應全部被去重
+            for i in range(options['tasks']):
+                enqueue('bench_noop', {'n': i, 'sleep': options['sleep']}, dedup_key=f'bench:{i}')
+            assert Task.objects.filter(name='bench_noop').count() == options['tasks']
+
+            start = time.perf_counter()
+            # 只領取 bench_noop，不碰佇列裡真正的工作
+            processed = TaskWorker(workers=workers, names=['bench_noop']).run(stop_when_empty=True)
+            run_time = time.perf_counter() - start
+
+            self.stdout.write(
+                f"workers={workers:<3} enqueue {options['tasks'] / enqueue_time:8.1f} tasks/s  "
+                f"process {processed / run_time:8.1f} tasks/s"
+            )
+        Task.objects.filter(name='bench_noop').delete()
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models import Question
+from core.services.recommender import SimilarQuestionIndex, document_text
+from core.services.registry import registry
+
+
+class Command(BaseCommand):
+    help = "全量重建相似題 TF-IDF 索引並存檔"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--bench', type=int, default=200, help="建完後量測 N 次查詢延遲（0 表示略過）")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        rows = Question.objects.order_by('id').values_list('id', 'content', 'passage__content', 'options', 'topic')
+        index = SimilarQuestionIndex()
+        index.build(
+            (question_id, document_text(content, passage), question_options, topic)
+            for question_id, content, passage, question_options, topic in rows.iterator(chunk_size=options['chunk_size'])
+        )
+        store = registry.get('recommender')
+        store.save(index)
+        self.stdout.write(self.style.SUCCESS(
+            f"{index.n_docs} 題、{len(index.postings)} 個詞，耗時 {time.perf_counter() - start:.1f}s → {store.path}"
+        ))
+
+        ids = list(index.vectors)[:options['bench']]
+        if ids:
+            timings = []
+            for question_id in ids:
+                begin = time.perf_counter()
+                index.similar(question_id, k=10)
+                timings.append((time.perf_counter() - begin) * 1000)
+            timings.sort()
+            self.stdout.write(f"top-10 查詢 p50={timings[len(timings) // 2]:.2f}ms max={timings[-1]:.2f}ms")
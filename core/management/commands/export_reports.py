@@ -0,0 +1,40 @@
+import resource
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.services.report_service import FORMATS, export_reports
+
+
+class Command(BaseCommand):
+    help = "一次產生全部學生的學習報告（各題型、每月趨勢、弱項），輸出 CSV 或 JSONL"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--output', default='-', help="輸出檔案，- 表示 stdout")
+        parser.add_argument('--workers', type=int, default=0, help="封存檔彙總與轉檔的行程數，0 表示在主行程處理")
+        parser.add_argument('--batch-size', type=int, default=500, help="每批交給 worker 的學生數")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="資料庫游標每次取回的列數")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        out = sys.stdout if options['output'] == '-' else open(options['output'], 'w', encoding='utf-8', newline='')
+        lines = 0
+        try:
+            for part in export_reports(
+                fmt=options['format'],
+                workers=options['workers'],
+                batch_size=options['batch_size'],
+                chunk_size=options['chunk_size'],
+            ):
+                out.write(part)
+                lines += part.count('\n')
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stderr.write(
+            f"輸出 {lines} 行，耗時 {time.perf_counter() - start:.2f}s，峰值記憶體 {peak_mb:.0f}MB"
+        )
@@ -0,0 +1,102 @@
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test import RequestFactory
+
+from core.models import ExamPaper, TestSession, User
+from core.views import exam_start_view
+
+
+class Command(BaseCommand):
+    help = "模擬大量學生同時開考，量測延遲與資料庫查詢數"
+
+    def add_arguments(self, parser):
+        parser.add_argument('paper_id', type=int)
+        parser.add_argument('--students', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=1000)
+        parser.add_argument('--keep', action='store_true', help="保留本次產生的 TestSession 與壓測帳號")
+
+    def handle(self, *args, **options):
+        if ExamPaper.get_cached(options['paper_id']) is None:
+            raise CommandError("考卷不存在或尚未發布")
+
+        # 舊版留下、密碼為 '!' 的壓測帳號一律清掉
+        User.objects.filter(username__regex=r'^loadtest_[0-9]+$', password='!').delete()
+        # 開考會寫一筆 TestSession，需要真的使用者；不夠就建立壓測帳號，結束時刪除
+        user_ids, created_ids = self._student_ids(options['students'])
+        existing = set(TestSession.objects.filter(user_id__in=user_ids).values_list('id', flat=True))
+        try:
+            self._run(options, user_ids)
+        finally:
+            if not options['keep']:
+                TestSession.objects.filter(user_id__in=user_ids).exclude(id__in=existing).delete()
+                User.objects.filter(id__in=created_ids).delete()
+                if created_ids:
+                    self.stdout.write(f"已刪除 {len(created_ids)} 個壓測帳號")
+
+    def _run(self, options, user_ids):
+        factory = RequestFactory()
+        path = f"/exam/{options['paper_id']}/"
+        concurrency = min(options['concurrency'], options['students'])
+        barrier = threading.Barrier(concurrency)
+        query_counts = []
+        lock = threading.Lock()
+
+        def start(student):
+            queries = [0, 0]  # 讀、寫
+
+            def count(execute, sql, params, many, context):
+                queries[0 if sql.lstrip().upper().startswith('SELECT') else 1] += 1
+                return execute(sql, params, many, context)
+
+            if student < concurrency:
+                barrier.wait()  # 第一波同時送出
+            request = factory.post(path)
+            # 不寫入資料庫的 session，只量測開考本身
+            request.session = SessionStore()
+            request.session['user_id'] = user_ids[student]
+            begin = time.perf_counter()
+            with connection.execute_wrapper(count):
+                response = exam_start_view(request, options['paper_id'])
+            elapsed = time.perf_counter() - begin
+            close_old_connections()
+            with lock:
+                query_counts.append(queries)
+            return elapsed, response.status_code
+
+        begin = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(start, range(options['students'])))
+        wall = time.perf_counter() - begin
+
+        latencies = sorted(r[0] * 1000 for r in results)
+        failures = sum(1 for r in results if r[1] != 302)
+        n = len(latencies)
+        reads = sum(q[0] for q in query_counts)
+        writes = sum(q[1] for q in query_counts)
+        self.stdout.write(
+            f"students={n} concurrency={concurrency} wall={wall:.2f}s throughput={n / wall:.0f}/s\n"
+            f"latency p50={latencies[n // 2]:.2f}ms p99={latencies[int(n * 0.99) - 1]:.2f}ms "
+            f"max={latencies[-1]:.2f}ms\n"
+            f"db reads={reads} ({reads / n:.2f}/start) writes={writes} ({writes / n:.2f}/start，TestSession) "
+            f"failures={failures}"
+        )
+
+    def _student_ids(self, count):
+        """回傳 (使用者 ID, 本次新建的 ID)；壓測帳號用隨機密碼，不能拿來登入"""
+        ids = list(User.objects.filter(role='student').order_by('id').values_list('id', flat=True)[:count])
+        missing = count - len(ids)
+        if missing <= 0:
+            return ids, []
+        prefix = f'loadtest_{secrets.token_hex(4)}_'
+        User.objects.bulk_create([
+            User(username=f'{prefix}{i}', password=secrets.token_urlsafe(32), role='student') for i in range(missing)
+        ])
+        created = list(User.objects.filter(username__startswith=prefix).values_list('id', flat=True))
+        self.stdout.write(f"建立 {missing} 個壓測帳號")
+        return ids + created, created
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models import Question
+from core.services.search_service import get_search_index
+
+
+class Command(BaseCommand):
+    help = "重建題庫全文搜尋索引（bulk_create 等不會觸發 signal 的匯入後使用）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        index = get_search_index()
+        start = time.perf_counter()
+        index.rebuild(Question.objects.select_related('passage').order_by('id'), chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{type(index).__name__} 重建完成，耗時 {time.perf_counter() - start:.1f}s"
+        ))
@@ -0,0 +1,87 @@
+import heapq
+from operator import itemgetter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Favorite, ReviewSchedule, TestRecord
+from core.services.archive_service import get_archive
+from core.services.review_service import ReviewScheduler, ReviewState
+
+
+class Command(BaseCommand):
+    help = "依全部作答紀錄（含已封存）重新計算每位使用者的間隔複習排程"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--user', type=int, help="只重算指定使用者 ID")
+
+    def handle(self, *args, **options):
+        self.scheduler = ReviewScheduler()
+        records = TestRecord.objects.order_by('user_id', 'timestamp', 'id')
+        if options['user']:
+            records = records.filter(user_id=options['user'])
+
+        hot = records.values_list('user_id', 'timestamp', 'question_id', 'is_correct').iterator(
+            chunk_size=options['chunk_size']
+        )
+        # 已封存的紀錄依相同順序合併進來，排程才會涵蓋完整歷史
+        archived = get_archive().iter_sorted(user_id=options['user'])
+        rows = heapq.merge(hot, archived, key=itemgetter(0, 1))
+
+        # 紀錄依使用者排序，一次只在記憶體中保留一位使用者的狀態
+        current_user = None
+        states = {}
+        favorites = {}
+        seen = set()
+        for user_id, timestamp, question_id, is_correct in rows:
+            if user_id != current_user:
+                if current_user is not None:
+                    self._flush(current_user, states, favorites)
+                    seen.add(current_user)
+                current_user = user_id
+                states = {}
+                favorites = self._favorites(user_id)
+
+            entry = states.get(question_id)
+            if entry is None:
+                # 與即時路徑一致：收藏後的作答（含答對）都推進排程；沒收藏也沒答錯過的題目不需要複習
+                starred_at = favorites.get(question_id)
+                if is_correct and (starred_at is None or starred_at > timestamp):
+                    continue
+                entry = (ReviewState(), None)
+            state = self.scheduler.next_state(entry[0], is_correct)
+            states[question_id] = (state, timestamp)
+
+        if current_user is not None:
+            self._flush(current_user, states, favorites)
+            seen.add(current_user)
+
+        # 只有收藏、沒有作答紀錄的使用者
+        favorite_users = Favorite.objects.values_list('user_id', flat=True).distinct()
+        if options['user']:
+            favorite_users = favorite_users.filter(user_id=options['user'])
+        for user_id in favorite_users.iterator():
+            if user_id not in seen:
+                self._flush(user_id, {}, self._favorites(user_id))
+                seen.add(user_id)
+
+        self.stdout.write(self.style.SUCCESS(f"已重新計算 {len(seen)} 位使用者的複習排程"))
+
+    @staticmethod
+    def _favorites(user_id):
+        return dict(Favorite.objects.filter(user_id=user_id).values_list('question_id', 'created_at'))
+
+    def _flush(self, user_id, states, favorites):
+        schedules = []
+        for question_id, (state, reviewed_at) in states.items():
+            schedule = ReviewSchedule(user_id=user_id, question_id=question_id)
+            schedule.apply_state(state, reviewed_at)
+            schedules.append(schedule)
+        for question_id, created_at in favorites.items():
+            if question_id not in states:
+                schedules.append(ReviewSchedule(user_id=user_id, question_id=question_id, due_at=created_at))
+
+        with transaction.atomic():
+            ReviewSchedule.objects.filter(user_id=user_id).delete()
+            ReviewSchedule.objects.bulk_create(schedules, batch_size=500)
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.services.fake_openai import FakeOpenAIServer
+
+
+class Command(BaseCommand):
+    help = "啟動本機假 OpenAI 服務（搭配 OPENAI_BASE_URL 使用）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--delay', type=float, default=0.0, help="每個請求延遲秒數")
+        parser.add_argument('--fail-first', type=int, default=0, help="前 N 個請求回傳錯誤")
+        parser.add_argument('--fail-status', type=int, default=503)
+
+    def handle(self, *args, **options):
+        server = FakeOpenAIServer(
+            port=options['port'],
+            delay=options['delay'],
+            fail_first=options['fail_first'],
+            fail_status=options['fail_status'],
+        )
+        self.stdout.write(f"OPENAI_BASE_URL={server.base_url}")
+        try:
+            server.httpd.serve_forever()
+        except KeyboardInterrupt:
+            server.stop()
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from core.services.task_queue import TaskWorker
+
+
+class Command(BaseCommand):
+    help = "啟動本機背景工作 worker（GPT 詳解、弱項診斷等）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="執行緒數量")
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="佇列為空時的等待秒數")
+        parser.add_argument('--once', action='store_true', help="處理完目前的工作後結束")
+
+    def handle(self, *args, **options):
+        import core.tasks  # noqa: F401  註冊工作處理函式
+
+        worker = TaskWorker(workers=options['workers'], batch_size=options['batch_size'])
+        released = worker.release_stale()
+        if released:
+            self.stdout.write(f"重新排入 {released} 筆中斷的工作")
+
+        self.stdout.write(f"worker 啟動（{options['workers']} 執行緒）")
+        try:
+            processed = worker.run(poll_interval=options['poll_interval'], stop_when_empty=options['once'])
+        except KeyboardInterrupt:
+            return
+        self.stdout.write(self.style.SUCCESS(f"完成 {processed} 筆工作"))
@@ -0,0 +1,46 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from .models import User
+from .services.profiling import profile_request, save_profile
+
+
+class ProfilingMiddleware:
+    """管理員專用的請求 profiling
+
+    PROFILING_ENABLED 為 False 時直接移出 middleware 鏈，不增加任何成本。
+    啟用時，帶 X-Profile: 1 標頭或 ?_profile=1 的請求會被記錄，
+    另外以 PROFILING_SAMPLE_RATE 的機率抽樣其他請求；都只限管理員。
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        self.interval = getattr(settings, 'PROFILING_INTERVAL', 0.001)
+        self.directory = settings.PROFILING_DIR
+
+    def __call__(self, request):
+        if not self._wants_profile(request):
+            return self.get_response(request)
+
+        with profile_request(self.interval) as (collector, sampler):
+            start = time.perf_counter()
+            with connection.execute_wrapper(collector.sql_wrapper):
+                response = self.get_response(request)
+            elapsed = time.perf_counter() - start
+        summary = save_profile(self.directory, request, response, collector, sampler, elapsed)
+        response['X-Profile-Id'] = summary['name']
+        return response
+
+    def _wants_profile(self, request):
+        flagged = request.headers.get('X-Profile') == '1' or request.GET.get('_profile') == '1'
+        if not flagged and not (self.sample_rate and random.random() < self.sample_rate):
+            return False
+        user_id = request.session.get('user_id')
+        return bool(user_id) and User.objects.filter(id=user_id, role='admin').exists()
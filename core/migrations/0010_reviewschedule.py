@@ -0,0 +1,32 @@
+# Generated by Django 4.2.21 on 2026-10-19 11:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_testrecord_test_result_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('due_at', models.DateTimeField()),
+                ('interval_days', models.IntegerField(default=0)),
+                ('ease_factor', models.FloatField(default=2.5)),
+                ('repetitions', models.IntegerField(default=0)),
+                ('lapses', models.IntegerField(default=0)),
+                ('last_reviewed', models.DateTimeField(blank=True, null=True)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.question')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.user')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'due_at'], name='core_review_user_id_12ac21_idx')],
+                'unique_together': {('user', 'question')},
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import DatabaseError, migrations, transaction
+
+# 直接寫 SQL，不引用 core.services：之後服務程式怎麼改都不影響這個 migration
+FTS_TABLE = 'core_question_fts'
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return  # 其他資料庫改用記憶體內的反向索引
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "content, options, topic UNINDEXED, is_gpt UNINDEXED, tokenize='unicode61')"
+            )
+    except DatabaseError:
+        return  # SQLite 沒有編進 FTS5
+    # options 與 question_fields() 相同：各選項的值以空白串接
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE} (rowid, content, options, topic, is_gpt) "
+        "SELECT q.id, q.content, "
+        "COALESCE((SELECT group_concat(o.value, ' ') FROM json_each(q.options) AS o), ''), "
+        "q.topic, q.is_gpt_generated FROM core_question AS q ORDER BY q.id"
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_question_explanation_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.21 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_question_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamPaper',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=100)),
+                ('topic', models.CharField(max_length=50)),
+                ('count', models.IntegerField(default=10)),
+                ('include_gpt', models.BooleanField(default=False)),
+                ('question_ids', models.JSONField(blank=True, default=list)),
+                ('seed', models.BigIntegerField(default=0)),
+                ('version', models.IntegerField(default=0)),
+                ('is_published', models.BooleanField(default=False)),
+                ('published_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
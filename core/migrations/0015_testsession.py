@@ -0,0 +1,37 @@
+# Generated by Django 4.2.21 on 2026-10-19 12:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_exampaper'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='testrecord',
+            name='test_result_id',
+            field=models.CharField(db_index=True, max_length=64),
+        ),
+        migrations.CreateModel(
+            name='TestSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('test_result_id', models.CharField(max_length=64)),
+                ('config', models.JSONField(blank=True, default=dict)),
+                ('question_count', models.IntegerField(default=0)),
+                ('answered_count', models.IntegerField(default=0)),
+                ('correct_count', models.IntegerField(default=0)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.user')),
+            ],
+            options={
+                'unique_together': {('user', 'test_result_id')},
+            },
+        ),
+    ]
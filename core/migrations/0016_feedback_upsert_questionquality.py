@@ -0,0 +1,66 @@
+# Generated by Django 4.2.21 on 2026-10-19 12:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Max, Sum
+
+
+def dedupe_feedback(apps, schema_editor):
+    """每人每題只保留最新一筆回饋，才能加上唯一約束"""
+    Feedback = apps.get_model('core', 'Feedback')
+    duplicates = (
+        Feedback.objects.values('user_id', 'question_id')
+        .annotate(n=Count('id'), keep=Max('id'))
+        .filter(n__gt=1)
+    )
+    for row in duplicates.iterator():
+        Feedback.objects.filter(user_id=row['user_id'], question_id=row['question_id']).exclude(id=row['keep']).delete()
+
+
+def build_quality(apps, schema_editor):
+    Feedback = apps.get_model('core', 'Feedback')
+    Question = apps.get_model('core', 'Question')
+    QuestionQuality = apps.get_model('core', 'QuestionQuality')
+
+    totals = Feedback.objects.values('question_id').annotate(n=Count('id'), total=Sum('rating')).order_by()
+    gpt_ids = set(Question.objects.filter(is_gpt_generated=True).values_list('id', flat=True))
+    batch = []
+    for row in totals.iterator():
+        mean = row['total'] / row['n']
+        batch.append(QuestionQuality(
+            question_id=row['question_id'],
+            rating_count=row['n'],
+            rating_sum=row['total'],
+            rating_mean=mean,
+            hidden=row['question_id'] in gpt_ids and row['n'] >= 5 and mean < 2.5,
+        ))
+        if len(batch) >= 500:
+            QuestionQuality.objects.bulk_create(batch)
+            batch = []
+    QuestionQuality.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_testsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionQuality',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='quality', serialize=False, to='core.question')),
+                ('rating_count', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('rating_mean', models.FloatField(default=0)),
+                ('hidden', models.BooleanField(db_index=True, default=False)),
+            ],
+        ),
+        migrations.RunPython(dedupe_feedback, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='feedback',
+            unique_together={('user', 'question')},
+        ),
+        migrations.RunPython(build_quality, migrations.RunPython.noop),
+    ]
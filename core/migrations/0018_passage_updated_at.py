@@ -0,0 +1,18 @@
+# Generated by Django 4.2.21 on 2026-10-19 12:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_passage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='passage',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
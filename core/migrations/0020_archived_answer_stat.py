@@ -0,0 +1,27 @@
+# Generated by Django 4.2.21 on 2026-10-19 12:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_task_dedup_pending_only'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAnswerStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('correct', models.IntegerField(default=0)),
+                ('total', models.IntegerField(default=0)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.question')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.user')),
+            ],
+            options={
+                'unique_together': {('user', 'question')},
+            },
+        ),
+    ]
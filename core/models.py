@@ -1,4 +1,11 @@
-from django.db import models
+import hashlib
+import random
+
+from django.core.cache import cache
+from django.db import models, transaction
+from django.utils import timezone
+
+from .services.review_service import ReviewScheduler, ReviewState
 
 class User(models.Model):
     ROLE_CHOICES = (
@@ -25,22 +32,85 @@ class User(models.Model):
     def create(cls, username, password):
         return cls.objects.create(username=username, password=password)
 
+    @classmethod
+    def directory_page(cls, prefix='', role=None, after=None, page_size=50):
+        """依帳號排序的 keyset 分頁；前綴搜尋改寫成範圍查詢，走 username 的唯一索引"""
+        qs = cls.objects.only('id', 'username', 'role').order_by('username')
+        if prefix:
+            qs = qs.filter(username__gte=prefix, username__lt=prefix + '\U0010ffff')
+        if role:
+            qs = qs.filter(role=role)
+        if after:
+            qs = qs.filter(username__gt=after)
+        rows = list(qs[:page_size + 1])
+        next_after = rows[page_size - 1].username if len(rows) > page_size else None
+        return rows[:page_size], next_after
+
+
+class Passage(models.Model):
+    """閱讀/克漏字共用的文章，以內容雜湊去重"""
+    content_hash = models.CharField(max_length=64, unique=True)
+    content = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # 題目頁 ETag / Last-Modified 會一起參考
+
+    def __str__(self):
+        return self.content[:30]
+
+    @staticmethod
+    def normalize(text):
+        return "\n".join(" ".join(line.split()) for line in str(text).strip().splitlines() if line.strip())
+
+    @classmethod
+    def hash_content(cls, text):
+        return hashlib.sha256(cls.normalize(text).encode('utf-8')).hexdigest()
+
+    @classmethod
+    def get_or_create_for(cls, text):
+        content = cls.normalize(text)
+        passage, _ = cls.objects.get_or_create(
+            content_hash=cls.hash_content(content),
+            defaults={'content': content},
+        )
+        return passage
+
 
 class Question(models.Model):
-    content = models.TextField()
+    passage = models.ForeignKey(Passage, null=True, blank=True, on_delete=models.PROTECT, related_name='questions')
+    content = models.TextField()  # 有 passage 時只存題幹
     options = models.JSONField()  # 用 dict 儲存 ABCD
     answer = models.CharField(max_length=1)  # 正解 A/B/C/D
     topic = models.CharField(max_length=50)  # vocab/grammar/cloze/reading
     is_gpt_generated = models.BooleanField(default=False)
     created_dt = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # 題目版本，用於 ETag / Last-Modified
 
     def __str__(self):
         return self.content[:30]
-    
+
+    @property
+    def full_text(self):
+        """文章 + 題幹，給需要完整題目文字的地方（例如 GPT 詳解）"""
+        if self.passage_id:
+            return f"{self.passage.content}\n{self.content}"
+        return self.content
+
+    @staticmethod
+    def group_by_passage(question_ids, passage_of):
+        """讓同一篇文章的題目相鄰，文章順序依第一次出現的位置"""
+        def group(qid):
+            return passage_of.get(qid) or f"q{qid}"
+
+        positions = {qid: i for i, qid in enumerate(question_ids)}
+        first_seen = {}
+        for qid in question_ids:
+            first_seen.setdefault(group(qid), positions[qid])
+        return sorted(question_ids, key=lambda qid: (first_seen[group(qid)], positions[qid]))
+
 
 
 class TestRecord(models.Model):
-    test_result_id = models.CharField(max_length=64) 
+    test_result_id = models.CharField(max_length=64, db_index=True)
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
@@ -62,6 +132,8 @@ class TestRecord(models.Model):
                 is_correct=(selected_option == question.answer),
                 test_result_id=test_result_id
             )
+            TestSession.record_answer(user_id, test_result_id, selected_option == question.answer)
+            ReviewSchedule.record_outcome(user_id, question.id, selected_option == question.answer)
 
     @classmethod
     def has_answered(cls, user_id, question_id, test_result_id):
@@ -73,8 +145,121 @@ class TestRecord(models.Model):
         records = cls.objects.filter(user_id=user_id)
         total = records.count()
         correct = records.filter(is_correct=True).count()
+        # 加上已封存的歷史紀錄（封存時已彙總，不必讀封存檔）
+        archived = ArchivedAnswerStat.objects.filter(user_id=user_id).aggregate(
+            correct=models.Sum('correct'), total=models.Sum('total')
+        )
+        total += archived['total'] or 0
+        correct += archived['correct'] or 0
         return (correct / total * 100) if total else 0
-    
+
+
+class ArchivedAnswerStat(models.Model):
+    """已封存作答紀錄的每人每題彙總；封存資料不會再變，封存時累加一次即可"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    correct = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'question')
+
+    def __str__(self):
+        return f"{self.user_id} Q{self.question_id} 封存 {self.correct}/{self.total}"
+
+    @staticmethod
+    def count_rows(rows):
+        """rows: [(user_id, question_id, is_correct)] -> {(user_id, question_id): [答對數, 總數]}"""
+        counts = {}
+        for user_id, question_id, is_correct in rows:
+            entry = counts.setdefault((user_id, question_id), [0, 0])
+            entry[0] += 1 if is_correct else 0
+            entry[1] += 1
+        return counts
+
+    @classmethod
+    def add_counts(cls, counts, batch_size=500):
+        """把 {(user_id, question_id): [答對數, 總數]} 累加進資料表；呼叫端負責交易"""
+        keys = list(counts)
+        existing = {}
+        for i in range(0, len(keys), batch_size):
+            chunk = keys[i:i + batch_size]
+            rows = cls.objects.filter(
+                user_id__in={k[0] for k in chunk}, question_id__in={k[1] for k in chunk}
+            )
+            for row in rows:
+                key = (row.user_id, row.question_id)
+                if key in counts:
+                    existing[key] = row
+
+        for key, row in existing.items():
+            row.correct += counts[key][0]
+            row.total += counts[key][1]
+        cls.objects.bulk_update(list(existing.values()), ['correct', 'total'], batch_size=batch_size)
+        cls.objects.bulk_create(
+            [
+                cls(user_id=user_id, question_id=question_id, correct=correct, total=total)
+                for (user_id, question_id), (correct, total) in counts.items()
+                if (user_id, question_id) not in existing
+            ],
+            batch_size=batch_size,
+        )
+
+
+class TestSession(models.Model):
+    """每次測驗一筆摘要，作答時即時累加分數，歷史頁不必 GROUP BY TestRecord"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    test_result_id = models.CharField(max_length=64)
+    config = models.JSONField(default=dict, blank=True)
+    question_count = models.IntegerField(default=0)
+    answered_count = models.IntegerField(default=0)
+    correct_count = models.IntegerField(default=0)
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('user', 'test_result_id')
+
+    def __str__(self):
+        return f"{self.user_id} 測驗 {self.test_result_id[:8]}：{self.correct_count}/{self.answered_count}"
+
+    @property
+    def accuracy(self):
+        return round(self.correct_count / self.answered_count * 100, 2) if self.answered_count else 0
+
+    @classmethod
+    def start(cls, user_id, test_result_id, config, question_count):
+        return cls.objects.create(
+            user_id=user_id,
+            test_result_id=test_result_id,
+            config=config,
+            question_count=question_count,
+        )
+
+    @classmethod
+    def record_answer(cls, user_id, test_result_id, is_correct):
+        """以單一 UPDATE 累加，不必先讀出來"""
+        cls.objects.filter(user_id=user_id, test_result_id=test_result_id).update(
+            answered_count=models.F('answered_count') + 1,
+            correct_count=models.F('correct_count') + (1 if is_correct else 0),
+        )
+
+    @classmethod
+    def finish(cls, user_id, test_result_id):
+        cls.objects.filter(user_id=user_id, test_result_id=test_result_id, finished_at__isnull=True).update(
+            finished_at=timezone.now()
+        )
+
+    @classmethod
+    def history_page(cls, user_id, before=None, page_size=20):
+        """keyset 分頁：以 id 遞減，before 為上一頁最後一筆的 id"""
+        qs = cls.objects.filter(user_id=user_id).order_by('-id')
+        if before:
+            qs = qs.filter(id__lt=before)
+        rows = list(qs[:page_size + 1])
+        next_before = rows[page_size - 1].id if len(rows) > page_size else None
+        return rows[:page_size], next_before
+
 
 class WeakTopic(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -89,6 +274,7 @@ class Explanation(models.Model):
     question = models.OneToOneField(Question, on_delete=models.CASCADE)
     explanation_text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     source = models.CharField(max_length=50, default='gpt')
 
     def __str__(self):
@@ -112,9 +298,94 @@ class Feedback(models.Model):
     comment = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    MIN_RATING = 1
+    MAX_RATING = 5
+
+    class Meta:
+        unique_together = ('user', 'question')  # 每人每題一筆，重複送出視為修改
+
     def __str__(self):
         return f"{self.user.username} 對 Q{self.question.id} 的回饋"
 
+    @classmethod
+    def submit_batch(cls, user_id, items):
+        """批次新增或修改評分；items 為 [(question_id, rating, comment)]，同題以最後一筆為準
+
+        回傳 (新增數, 修改數)。題目評分彙總在同一個 transaction 內增量更新。
+        """
+        latest = {question_id: (rating, comment) for question_id, rating, comment in items}
+        if not latest:
+            return 0, 0
+
+        with transaction.atomic():
+            existing = {
+                fb.question_id: fb
+                for fb in cls.objects.filter(user_id=user_id, question_id__in=latest)
+            }
+            to_create, to_update = [], []
+            deltas = {}  # question_id -> [count 變化, sum 變化]
+            for question_id, (rating, comment) in latest.items():
+                fb = existing.get(question_id)
+                if fb is None:
+                    to_create.append(cls(user_id=user_id, question_id=question_id, rating=rating, comment=comment))
+                    deltas[question_id] = [1, rating]
+                else:
+                    deltas[question_id] = [0, rating - fb.rating]
+                    fb.rating = rating
+                    fb.comment = comment
+                    to_update.append(fb)
+
+            cls.objects.bulk_create(to_create, batch_size=500)
+            cls.objects.bulk_update(to_update, ['rating', 'comment'], batch_size=500)
+            QuestionQuality.apply_deltas(deltas)
+        return len(to_create), len(to_update)
+
+
+class QuestionQuality(models.Model):
+    """每題評分的累計值；讀取平均只需一筆主鍵查詢"""
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='quality')
+    rating_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_mean = models.FloatField(default=0)
+    hidden = models.BooleanField(default=False, db_index=True)  # GPT 題評分過低時自動排除
+
+    # 至少 HIDE_MIN_COUNT 筆評分且平均低於 HIDE_BELOW 才隱藏
+    HIDE_MIN_COUNT = 5
+    HIDE_BELOW = 2.5
+
+    def __str__(self):
+        return f"Q{self.question_id} 評分 {self.rating_mean:.2f}（{self.rating_count}）"
+
+    def refresh_derived(self, is_gpt_generated):
+        self.rating_mean = self.rating_sum / self.rating_count if self.rating_count else 0
+        self.hidden = bool(
+            is_gpt_generated
+            and self.rating_count >= self.HIDE_MIN_COUNT
+            and self.rating_mean < self.HIDE_BELOW
+        )
+
+    @classmethod
+    def apply_deltas(cls, deltas):
+        """deltas: {question_id: [count 變化, sum 變化]}，不重新彙總所有評分"""
+        if not deltas:
+            return
+        gpt_flags = dict(Question.objects.filter(id__in=deltas).values_list('id', 'is_gpt_generated'))
+        rows = cls.objects.select_for_update().in_bulk(list(deltas))
+        to_create, to_update = [], []
+        for question_id, (d_count, d_sum) in deltas.items():
+            row = rows.get(question_id)
+            if row is None:
+                row = cls(question_id=question_id)
+                to_create.append(row)
+            else:
+                to_update.append(row)
+            row.rating_count += d_count
+            row.rating_sum += d_sum
+            row.refresh_derived(gpt_flags.get(question_id, False))
+
+        cls.objects.bulk_create(to_create, batch_size=500)
+        cls.objects.bulk_update(to_update, ['rating_count', 'rating_sum', 'rating_mean', 'hidden'], batch_size=500)
+
 
 class Favorite(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -131,7 +402,7 @@ class Favorite(models.Model):
     @classmethod
     def get_user_favorites(cls, user_id):
         """取得指定使用者所有收藏紀錄"""
-        return cls.objects.filter(user_id=user_id)
+        return cls.objects.filter(user_id=user_id).select_related('question__passage')
 
     @classmethod
     def is_starred(cls, user_id, question_id):
@@ -144,7 +415,9 @@ class Favorite(models.Model):
         favorite, created = cls.objects.get_or_create(user_id=user_id, question_id=question_id)
         if not created:
             favorite.delete()
+            ReviewSchedule.dequeue(user_id, question_id)
             return False
+        ReviewSchedule.enqueue(user_id, question_id)
         return True
 
     @classmethod
@@ -156,3 +429,202 @@ class Favorite(models.Model):
             favorite.save()
         except cls.DoesNotExist:
             pass
+
+
+class ReviewSchedule(models.Model):
+    """每位使用者每題一筆的間隔複習狀態（錯題與收藏題）"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    due_at = models.DateTimeField()
+    interval_days = models.IntegerField(default=0)
+    ease_factor = models.FloatField(default=2.5)
+    repetitions = models.IntegerField(default=0)
+    lapses = models.IntegerField(default=0)
+    last_reviewed = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('user', 'question')
+        indexes = [
+            models.Index(fields=['user', 'due_at']),  # 「立即複習」只走這個索引
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} 複習 Q{self.question_id} @ {self.due_at:%Y-%m-%d}"
+
+    def to_state(self):
+        return ReviewState(
+            interval_days=self.interval_days,
+            ease_factor=self.ease_factor,
+            repetitions=self.repetitions,
+            lapses=self.lapses,
+        )
+
+    def apply_state(self, state, reviewed_at):
+        self.interval_days = state.interval_days
+        self.ease_factor = state.ease_factor
+        self.repetitions = state.repetitions
+        self.lapses = state.lapses
+        self.last_reviewed = reviewed_at
+        self.due_at = ReviewScheduler().due_at(reviewed_at, state)
+
+    @classmethod
+    def enqueue(cls, user_id, question_id):
+        """收藏題目時排入複習，已存在則不變"""
+        cls.objects.get_or_create(
+            user_id=user_id,
+            question_id=question_id,
+            defaults={'due_at': timezone.now()},
+        )
+
+    @classmethod
+    def dequeue(cls, user_id, question_id):
+        """取消收藏時移除只因收藏而存在的排程；答錯過（lapses > 0）的題目仍要複習"""
+        cls.objects.filter(user_id=user_id, question_id=question_id, lapses=0).delete()
+
+    @classmethod
+    def record_outcome(cls, user_id, question_id, is_correct):
+        """依作答結果更新排程；答錯的題目會自動加入複習"""
+        now = timezone.now()
+        schedule = cls.objects.filter(user_id=user_id, question_id=question_id).first()
+        if schedule is None:
+            if is_correct:
+                return None
+            schedule = cls(user_id=user_id, question_id=question_id)
+
+        schedule.apply_state(ReviewScheduler().next_state(schedule.to_state(), is_correct), now)
+        schedule.save()
+        return schedule
+
+    @classmethod
+    def get_due_question_ids(cls, user_id, limit, topic=None):
+        """取得到期的題目 ID，依 due_at 由舊到新"""
+        qs = cls.objects.filter(user_id=user_id, due_at__lte=timezone.now())
+        if topic:
+            qs = qs.filter(question__topic=topic)
+        return list(qs.order_by('due_at').values_list('question_id', flat=True)[:limit])
+
+
+class Task(models.Model):
+    """背景工作佇列（資料表實作，不需要外部 broker）"""
+    STATUS_CHOICES = (
+        ('pending', '等待中'),
+        ('running', '執行中'),
+        ('done', '完成'),
+        ('failed', '失敗'),
+    )
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    dedup_key = models.CharField(max_length=200, blank=True, default='')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+        constraints = [
+            # 同一個 dedup_key 只允許一筆等待中的工作；執行中的不算，執行期間的新異動要能再排一筆
+            models.UniqueConstraint(
+                fields=['dedup_key'],
+                condition=models.Q(status='pending') & ~models.Q(dedup_key=''),
+                name='unique_pending_task_dedup_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
+
+
+class ExamPaper(models.Model):
+    """管理員事先發布的考卷：題目清單凍結，學生開考時只讀快取"""
+    title = models.CharField(max_length=100)
+    topic = models.CharField(max_length=50)
+    count = models.IntegerField(default=10)
+    include_gpt = models.BooleanField(default=False)
+    question_ids = models.JSONField(default=list, blank=True)
+    seed = models.BigIntegerField(default=0)
+    version = models.IntegerField(default=0)
+    is_published = models.BooleanField(default=False)
+    published_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    CACHE_TIMEOUT = 60 * 60 * 6
+
+    def __str__(self):
+        return f"{self.title} v{self.version}"
+
+    @staticmethod
+    def cache_key(paper_id):
+        return f"exam_paper:{paper_id}"
+
+    def publish(self):
+        """重新組卷並發布新版本；已開考的學生保留 session 中的舊版題目"""
+        qs = Question.objects.filter(topic=self.topic).exclude(quality__hidden=True)
+        if not self.include_gpt:
+            qs = qs.filter(is_gpt_generated=False)
+        ids = list(qs.values_list('id', flat=True))
+        selected = sorted(random.sample(ids, min(self.count, len(ids))))
+        passage_of = dict(Question.objects.filter(id__in=selected, passage__isnull=False).values_list('id', 'passage_id'))
+        self.question_ids = Question.group_by_passage(selected, passage_of)
+        self.seed = random.getrandbits(62)
+        self.version += 1
+        self.is_published = True
+        self.published_at = timezone.now()
+        self.save()  # post_save 會更新快取
+
+    def unpublish(self):
+        """停止開考；post_save 會移除快取，已開考的學生不受影響"""
+        self.is_published = False
+        self.save()
+
+    def snapshot(self):
+        # 同一篇文章的題目成一組，打亂時整組移動
+        passage_of = dict(
+            Question.objects.filter(id__in=self.question_ids, passage__isnull=False).values_list('id', 'passage_id')
+        )
+        groups = {}
+        for qid in self.question_ids:
+            groups.setdefault(passage_of.get(qid) or f"q{qid}", []).append(qid)
+        return {
+            'id': self.id,
+            'title': self.title,
+            'version': self.version,
+            'seed': self.seed,
+            'question_ids': list(self.question_ids),
+            'groups': list(groups.values()),
+        }
+
+    def warm_cache(self):
+        cache.set(self.cache_key(self.id), self.snapshot(), self.CACHE_TIMEOUT)
+
+    def clear_cache(self):
+        cache.delete(self.cache_key(self.id))
+
+    @classmethod
+    def get_cached(cls, paper_id):
+        """開考時唯一的讀取：快取命中就不查資料庫"""
+        snapshot = cache.get(cls.cache_key(paper_id))
+        if snapshot is None:
+            paper = cls.objects.filter(id=paper_id, is_published=True).first()
+            if paper is None:
+                return None
+            snapshot = paper.snapshot()
+            cache.set(cls.cache_key(paper_id), snapshot, cls.CACHE_TIMEOUT)
+        return snapshot
+
+    @staticmethod
+    def shuffled_for(snapshot, user_id):
+        """同一份考卷、同一位學生永遠得到相同的題序"""
+        rng = random.Random(f"{snapshot['seed']}:{user_id}")
+        groups = [list(group) for group in snapshot.get('groups') or [[qid] for qid in snapshot['question_ids']]]
+        rng.shuffle(groups)
+        for group in groups:
+            rng.shuffle(group)
+        return [qid for group in groups for qid in group]
@@ -0,0 +1,219 @@
+import heapq
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+MAGIC = b'TRC1'
+_HEADER_LEN = struct.Struct('<I')
+
+# 欄位名稱 -> array typecode；test_result_id 以字典編碼存成索引
+COLUMNS = {
+    'id': 'q',
+    'user_id': 'q',
+    'question_id': 'q',
+    'is_correct': 'b',
+    'selected_option': 'I',  # 作答值直接來自 POST，不保證是 A-D；舊檔的 'B' 依 header 讀取
+    'timestamp': 'q',  # epoch 微秒
+    'test_result_idx': 'I',
+}
+
+
+def _to_micros(dt):
+    return int(dt.timestamp() * 1_000_000)
+
+
+def _from_micros(value):
+    return datetime.fromtimestamp(value / 1_000_000, tz=dt_timezone.utc)
+
+
+class ColumnarWriter:
+    """把一批 TestRecord 寫成一個按欄壓縮的檔案
+
+    檔案格式：MAGIC | header 長度 (uint32) | header JSON | 各欄 zlib 壓縮資料
+    header 記錄每欄的 offset / length，讀取時只解壓需要的欄位。
+    """
+
+    def __init__(self, level=6):
+        self.level = level
+
+    def write(self, path, rows):
+        """rows: [(id, user_id, question_id, is_correct, selected_option, timestamp, test_result_id)]"""
+        columns = {name: array(code) for name, code in COLUMNS.items()}
+        dictionary = {}
+        for record_id, user_id, question_id, is_correct, selected, timestamp, test_result_id in rows:
+            columns['id'].append(record_id)
+            columns['user_id'].append(user_id)
+            columns['question_id'].append(question_id)
+            columns['is_correct'].append(1 if is_correct else 0)
+            columns['selected_option'].append(ord(selected[0]) if selected else 0)
+            columns['timestamp'].append(_to_micros(timestamp))
+            columns['test_result_idx'].append(dictionary.setdefault(test_result_id, len(dictionary)))
+
+        blobs = []
+        meta = []
+        offset = 0
+        for name, values in columns.items():
+            if sys.byteorder != 'little':
+                values.byteswap()
+            blob = zlib.compress(values.tobytes(), self.level)
+            meta.append({'name': name, 'typecode': values.typecode, 'offset': offset, 'length': len(blob)})
+            blobs.append(blob)
+            offset += len(blob)
+
+        header = json.dumps({
+            'rows': len(columns['id']),
+            'columns': meta,
+            'test_result_ids': list(dictionary),
+            'min_timestamp': min(columns['timestamp'], default=0),
+            'max_timestamp': max(columns['timestamp'], default=0),
+        }).encode()
+
+        # 先寫暫存檔再 rename，確保檔案完整落地後才刪除熱資料
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + '.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(MAGIC)
+            f.write(_HEADER_LEN.pack(len(header)))
+            f.write(header)
+            for blob in blobs:
+                f.write(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        return path
+
+
+class ColumnarFile:
+    """以 mmap 開啟單一封存檔，欄位按需解壓"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:4] != MAGIC:
+            self.close()
+            raise ValueError(f"不是封存檔：{self.path}")
+        (header_len,) = _HEADER_LEN.unpack(self._mm[4:8])
+        self.header = json.loads(self._mm[8:8 + header_len])
+        self._data_start = 8 + header_len
+        self._columns = {c['name']: c for c in self.header['columns']}
+
+    @property
+    def rows(self):
+        return self.header['rows']
+
+    def column(self, name):
+        meta = self._columns[name]
+        start = self._data_start + meta['offset']
+        values = array(meta['typecode'])
+        values.frombytes(zlib.decompress(self._mm[start:start + meta['length']]))
+        if sys.byteorder != 'little':
+            values.byteswap()
+        return values
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RecordArchive:
+    """按月分區的 TestRecord 封存目錄：<root>/YYYY-MM/part-*.trc"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def partition_path(self, year, month, first_id):
+        return self.root / f"{year:04d}-{month:02d}" / f"part-{first_id:012d}.trc"
+
+    def files(self, months=None):
+        if not self.root.exists():
+            return []
+        paths = []
+        for partition in sorted(self.root.iterdir()):
+            if partition.is_dir() and (months is None or partition.name in months):
+                paths.extend(sorted(partition.glob('*.trc')))
+        return paths
+
+    def scan(self, columns, user_id=None, months=None):
+        """逐檔產生 {欄位: array}；指定 user_id 時只保留該使用者的列"""
+        for path in self.files(months):
+            with ColumnarFile(path) as f:
+                if user_id is None:
+                    yield {name: f.column(name) for name in columns}
+                    continue
+                users = f.column('user_id')
+                picked = [i for i, uid in enumerate(users) if uid == user_id]
+                if not picked:
+                    continue
+                data = {}
+                for name in columns:
+                    values = users if name == 'user_id' else f.column(name)
+                    data[name] = array(values.typecode, (values[i] for i in picked))
+                yield data
+
+    def iter_records(self, user_id=None, months=None):
+        """還原成 dict，方便除錯或匯出"""
+        for path in self.files(months):
+            with ColumnarFile(path) as f:
+                cols = {name: f.column(name) for name in COLUMNS}
+                ids = f.header['test_result_ids']
+                for i in range(f.rows):
+                    if user_id is not None and cols['user_id'][i] != user_id:
+                        continue
+                    yield {
+                        'id': cols['id'][i],
+                        'user_id': cols['user_id'][i],
+                        'question_id': cols['question_id'][i],
+                        'is_correct': bool(cols['is_correct'][i]),
+                        'selected_option': chr(cols['selected_option'][i]) if cols['selected_option'][i] else '',
+                        'timestamp': _from_micros(cols['timestamp'][i]),
+                        'test_result_id': ids[cols['test_result_idx'][i]],
+                    }
+
+    def iter_sorted(self, user_id=None):
+        """依 (user_id, timestamp) 排序產生 (user_id, timestamp, question_id, is_correct)
+
+        每個檔案各自排序後再合併，可以和資料庫依相同順序取出的紀錄用 heapq.merge 接起來。
+        """
+        streams = [
+            _sorted_rows(data)
+            for data in self.scan(['user_id', 'question_id', 'is_correct', 'timestamp'], user_id=user_id)
+        ]
+        return heapq.merge(*streams)
+
+    def item_stats(self, user_id=None):
+        """每題的 {question_id: [答對數, 總數]}"""
+        stats = defaultdict(lambda: [0, 0])
+        for data in self.scan(['question_id', 'is_correct'], user_id=user_id):
+            for question_id, is_correct in zip(data['question_id'], data['is_correct']):
+                entry = stats[question_id]
+                entry[0] += is_correct
+                entry[1] += 1
+        return dict(stats)
+
+
+def _sorted_rows(data):
+    users, timestamps = data['user_id'], data['timestamp']
+    questions, correct = data['question_id'], data['is_correct']
+    order = sorted(range(len(users)), key=lambda i: (users[i], timestamps[i]))
+    for i in order:
+        yield users[i], _from_micros(timestamps[i]), questions[i], bool(correct[i])
+
+
+def get_archive():
+    from django.conf import settings
+    return RecordArchive(settings.RECORD_ARCHIVE_DIR)
@@ -0,0 +1,94 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOpenAIServer:
+    """本機假的 chat completions 端點，用來測試逾時、重試與斷路器
+
+    server = FakeOpenAIServer(delay=0.5, fail_first=2).start()
+    client = OpenAIClient(api_key='test', base_url=server.base_url)
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, delay=0.0, fail_first=0, fail_status=503, reply="假的詳解",
+                 raw_body=None):
+        self.delay = delay
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.reply = reply
+        self.raw_body = raw_body  # 設定時成功回應改成這段非 JSON 文字（模擬代理伺服器錯誤頁）
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'{}')
+                fake.handle(self, body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def handle(self, handler, body):
+        with self._lock:
+            self.requests += 1
+            failing = self.requests <= self.fail_first
+        if self.delay:
+            time.sleep(self.delay)
+
+        if failing:
+            self._send(handler, self.fail_status, {'error': {'message': 'fake outage'}})
+            return
+
+        if self.raw_body is not None:
+            payload = self.raw_body.encode()
+            handler.send_response(200)
+            handler.send_header('Content-Type', 'text/html')
+            handler.send_header('Content-Length', str(len(payload)))
+            handler.end_headers()
+            handler.wfile.write(payload)
+            return
+
+        prompt = body.get('messages', [{}])[-1].get('content', '')
+        self._send(handler, 200, {
+            'choices': [{'message': {'role': 'assistant', 'content': self.reply}}],
+            'usage': {
+                'prompt_tokens': len(prompt.split()),
+                'completion_tokens': len(self.reply.split()),
+            },
+        })
+
+    def _send(self, handler, status, data):
+        payload = json.dumps(data, ensure_ascii=False).encode()
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(payload)))
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -1,18 +1,20 @@
-class GPTExplanationService:
-    def __init__(self, gpt_client):
-        self.gpt_client = gpt_client
+from .prompt_builder import PromptBuilder
 
-    def explain(self, question, answer, options):
-        prompt = self._build_prompt(question, answer, options)
-        return self.gpt_client.get_response(prompt)
 
+class GPTExplanationService:
+    def __init__(self, gpt_client, prompt_builder=None, timeout=30):
+        self.gpt_client = gpt_client
+        self.prompt_builder = prompt_builder or PromptBuilder()
+        self.timeout = timeout
 
-    def _build_prompt(self, q, a, options):
-        options_text = "\n".join([f"{key}. {value}" for key, value in options.items()])
-        return f"""請說明為什麼下面的英文選擇題中，選項「{a}」是正確或錯誤的，盡可能在100字以內說明每個選項，要在選項前面備註。
-                題目：{q}
-                選項：
-                {options_text}
-                正確答案：{a}
-                請用中文母語的觀點解釋，評斷學生可能錯誤的原因，幫助學生學習。"""
+    def explain(self, question, answer, options=None, topic=None, passage=None):
+        """回傳 GPTResult，呼叫端用 result.ok 判斷是否成功"""
+        prompt = self._build_prompt(question, answer, options, topic, passage)
+        return self.gpt_client.complete(
+            prompt,
+            max_tokens=self.prompt_builder.budget_for(topic)['completion'],
+            timeout=self.timeout,
+        )
 
+    def _build_prompt(self, q, a, options, topic=None, passage=None):
+        return self.prompt_builder.build_explanation_prompt(q, a, options, topic, passage)
@@ -1,16 +1,210 @@
-import openai
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .profiling import timed
+
+DEFAULT_BASE_URL = 'https://api.openai.com/v1'
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+@dataclass
+class GPTResult:
+    """GPT 呼叫結果；失敗時 ok=False，error 不會被當成詳解內容"""
+    ok: bool
+    text: str = ''
+    usage: dict = field(default_factory=dict)
+    error: str = ''
+    error_type: str = ''  # timeout / connection / server / http / circuit_open / busy / config
+    attempts: int = 0
+
+
+class CircuitBreaker:
+    """連續失敗達門檻後斷路，冷卻時間內直接失敗；冷卻後放一個請求試探"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.half_open_probe = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.half_open_probe:
+                self.half_open_probe = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.half_open_probe = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.half_open_probe or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.half_open_probe = False
+
+
+class _RetryableError(Exception):
+    def __init__(self, error_type, message, retry_after=None):
+        super().__init__(message)
+        self.error_type = error_type
+        self.retry_after = retry_after
+
 
 class OpenAIClient:
-    def __init__(self, api_key, model='gpt-4.1-nano'):
-        openai.api_key = api_key
+    def __init__(self, api_key, model='gpt-4.1-nano', base_url=None, timeout=30, connect_timeout=5,
+                 max_tokens=None, max_retries=2, backoff_base=0.5, backoff_max=8,
+                 max_concurrency=8, breaker=None):
+        self.api_key = api_key
         self.model = model
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip('/')
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_tokens = max_tokens
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        # 限制同時在等 API 的執行緒數，供應商變慢時不會佔滿所有 worker
+        self._slots = threading.BoundedSemaphore(max_concurrency)
 
-    def get_response(self, prompt):
+        # 重複使用連線（keep-alive），不必每次重新 TLS 握手
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def complete(self, prompt, max_tokens=None, timeout=None, model=None):
+        if not self.api_key:
+            return GPTResult(ok=False, error="未設定 OPENAI_API_KEY", error_type='config')
+        if not self.breaker.allow():
+            return GPTResult(ok=False, error="GPT 服務暫時無法使用，請稍後再試", error_type='circuit_open')
+        if not self._slots.acquire(timeout=1):
+            return GPTResult(ok=False, error="GPT 服務忙碌中，請稍後再試", error_type='busy')
+
+        payload = {
+            'model': model or self.model,
+            'messages': [{"role": "user", "content": prompt}],
+        }
+        max_tokens = max_tokens or self.max_tokens
+        if max_tokens:
+            payload['max_tokens'] = max_tokens
+
+        result = None
+        try:
+            with timed('openai'):
+                result = self._request_with_retries(payload, timeout or self.timeout)
+        finally:
+            self._slots.release()
+            # 每條路徑都要回報斷路器，否則半開試探會一直卡住
+            if result is None or not (result.ok or result.error_type == 'http'):
+                self.breaker.record_failure()
+            else:
+                # 4xx（參數錯誤等）代表服務有回應，不算服務中斷
+                self.breaker.record_success()
+        return result
+
+    def get_response(self, prompt, max_tokens=None, timeout=None, model=None):
+        return self.complete(prompt, max_tokens=max_tokens, timeout=timeout, model=model)
+
+    def _request_with_retries(self, payload, timeout):
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                data = self._post(payload, timeout)
+            except _RetryableError as e:
+                if attempt > self.max_retries:
+                    return GPTResult(ok=False, error=str(e), error_type=e.error_type, attempts=attempt)
+                time.sleep(self._backoff(attempt, e.retry_after))
+                continue
+            except requests.HTTPError as e:
+                return GPTResult(ok=False, error=str(e), error_type='http', attempts=attempt)
+            except requests.RequestException as e:
+                return GPTResult(ok=False, error=f"GPT 請求失敗：{e}", error_type='connection', attempts=attempt)
+
+            try:
+                text = data['choices'][0]['message']['content'].strip()
+            except (KeyError, IndexError, TypeError, AttributeError):
+                return GPTResult(ok=False, error="GPT 回應格式錯誤", error_type='http', attempts=attempt)
+            return GPTResult(ok=True, text=text, usage=data.get('usage') or {}, attempts=attempt)
+
+    def _post(self, payload, timeout):
         try:
-            response = openai.ChatCompletion.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}]
+            response = self.session.post(
+                f"{self.base_url}/chat/completions",
+                json=payload,
+                headers={'Authorization': f"Bearer {self.api_key}"},
+                timeout=(self.connect_timeout, timeout),
             )
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            return f"錯誤：{e}"
+        except requests.Timeout as e:
+            raise _RetryableError('timeout', f"GPT 逾時：{e}")
+        except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+            raise _RetryableError('connection', f"GPT 連線失敗：{e}")
+
+        if response.status_code in RETRY_STATUS:
+            retry_after = response.headers.get('Retry-After')
+            raise _RetryableError(
+                'server',
+                f"GPT 服務錯誤 HTTP {response.status_code}",
+                retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+            )
+        response.raise_for_status()
+        try:
+            return response.json()
+        except ValueError:
+            # 例如代理伺服器回傳的錯誤頁
+            raise _RetryableError('server', f"GPT 回應不是 JSON（HTTP {response.status_code}）")
+
+    def _backoff(self, attempt, retry_after=None):
+        """指數退避 + full jitter"""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+        delay = random.uniform(0, delay)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """整個 process 共用一個 client（連線池與斷路器狀態共享）"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OpenAIClient(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    model=os.getenv("OPENAI_MODEL", 'gpt-4.1-nano'),
+                    base_url=os.getenv("OPENAI_BASE_URL"),
+                )
+    return _client
@@ -0,0 +1,128 @@
+import contextvars
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+_active = contextvars.ContextVar('profiling_collector', default=None)
+
+
+class RequestCollector:
+    """收集單一請求的 SQL 與外部呼叫（OpenAI）耗時"""
+
+    def __init__(self):
+        self.queries = []
+        self.external = Counter()
+        self.external_calls = Counter()
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+
+def timed(name):
+    """外部呼叫計時；沒有在 profiling 時回傳 nullcontext，幾乎沒有成本"""
+    collector = _active.get()
+    if collector is None:
+        return nullcontext()
+    return _timed(collector, name)
+
+
+@contextmanager
+def _timed(collector, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        collector.external[name] += time.perf_counter() - start
+        collector.external_calls[name] += 1
+
+
+class StackSampler:
+    """背景執行緒定期抓目標執行緒的 call stack，輸出 flamegraph 用的 collapsed 格式"""
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.stacks = Counter()
+        self._target = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+@contextmanager
+def profile_request(interval=0.001):
+    collector = RequestCollector()
+    token = _active.set(collector)
+    sampler = StackSampler(interval).start()
+    try:
+        yield collector, sampler
+    finally:
+        sampler.stop()
+        _active.reset(token)
+
+
+def save_profile(directory, request, response, collector, sampler, elapsed):
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}-" \
+           f"{request.method}-{request.path.strip('/').replace('/', '_') or 'root'}"
+
+    (directory / f"{name}.collapsed").write_text(sampler.collapsed(), encoding='utf-8')
+    slowest = sorted(collector.queries, key=lambda q: -q[1])[:10]
+    summary = {
+        'name': name,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'elapsed_ms': round(elapsed * 1000, 2),
+        'samples': sum(sampler.stacks.values()),
+        'sql_count': len(collector.queries),
+        'sql_ms': round(sum(q[1] for q in collector.queries) * 1000, 2),
+        'slowest_sql': [{'sql': sql, 'ms': round(t * 1000, 2)} for sql, t in slowest],
+        'external_ms': {k: round(v * 1000, 2) for k, v in collector.external.items()},
+        'external_calls': dict(collector.external_calls),
+    }
+    (directory / f"{name}.json").write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding='utf-8')
+    return summary
+
+
+def list_profiles(directory, limit=100):
+    directory = Path(directory)
+    if not directory.exists():
+        return []
+    summaries = []
+    for path in sorted(directory.glob('*.json'), reverse=True)[:limit]:
+        try:
+            summaries.append(json.loads(path.read_text(encoding='utf-8')))
+        except (OSError, ValueError):
+            continue
+    return summaries
@@ -0,0 +1,102 @@
+import re
+
+
+# 各題型 prompt 的 token 上限與回覆的 max_tokens
+TOPIC_BUDGETS = {
+    'vocab': {'prompt': 300, 'completion': 300},
+    'grammar': {'prompt': 350, 'completion': 350},
+    'cloze': {'prompt': 700, 'completion': 400},
+    'reading': {'prompt': 900, 'completion': 450},
+}
+DEFAULT_BUDGET = {'prompt': 600, 'completion': 400}
+
+TRUNCATION_MARK = " …（中略）… "
+
+_CJK = re.compile(r'[\u3000-\u9fff\uff00-\uffef]')
+_WORD = re.compile(r'[A-Za-z0-9]+|[^\sA-Za-z0-9\u3000-\u9fff\uff00-\uffef]')
+_SPACES = re.compile(r'[ \t\u3000]+')
+_BLANK_LINES = re.compile(r'\n\s*\n+')
+
+
+class TokenCounter:
+    """有 tiktoken 用 tiktoken，否則估算：中日文每字約 1 token，英文每字約 1.3 token"""
+
+    def __init__(self, encoding='o200k_base'):
+        self.encoder = None
+        try:
+            import tiktoken  # 較重，建立 counter 時才載入
+            self.encoder = tiktoken.get_encoding(encoding)
+        except Exception:  # 沒安裝 tiktoken 或無法下載編碼表時改用估算
+            self.encoder = None
+
+    def count(self, text):
+        if not text:
+            return 0
+        if self.encoder is not None:
+            return len(self.encoder.encode(text))
+        cjk = len(_CJK.findall(text))
+        words = _WORD.findall(text)
+        return cjk + sum(1 if len(w) <= 4 else (len(w) + 3) // 4 for w in words)
+
+
+def compact(text):
+    """去掉縮排與多餘空白，保留段落換行"""
+    text = _SPACES.sub(' ', str(text or ''))
+    lines = [line.strip() for line in text.splitlines()]
+    return _BLANK_LINES.sub('\n', '\n'.join(lines)).strip()
+
+
+class PromptBuilder:
+    def __init__(self, counter=None):
+        self.counter = counter or TokenCounter()
+
+    def budget_for(self, topic):
+        return TOPIC_BUDGETS.get(topic, DEFAULT_BUDGET)
+
+    def build_explanation_prompt(self, question, answer, options=None, topic=None, passage=None):
+        options_text = "\n".join(f"{key}. {compact(value)}" for key, value in (options or {}).items())
+        head = "請說明下面英文選擇題中，選項「{a}」為何正確或錯誤，每個選項在前面標註並盡量在100字內說明。".format(a=answer)
+        tail = f"選項：\n{options_text}\n正確答案：{answer}\n請用中文母語者的觀點解釋，指出學生可能錯的原因。"
+
+        # 題目以外的部分固定，剩下的預算都給題目本文，超過就截斷長篇文章
+        fixed = self.counter.count(head) + self.counter.count(tail) + 4
+        budget = self.budget_for(topic)['prompt'] - fixed
+        if passage:
+            # 有共用文章時保留完整題幹，只截斷文章
+            stem = compact(question)
+            passage_text = self.truncate(compact(passage), budget - self.counter.count(stem) - 4)
+            return f"{head}\n文章：{passage_text}\n題目：{stem}\n{tail}"
+        question_text = self.truncate(compact(question), budget)
+        return f"{head}\n題目：{question_text}\n{tail}"
+
+    def truncate(self, text, max_tokens):
+        """超過 max_tokens 時保留開頭與結尾（閱讀題的提問通常在最後），中間以標記省略"""
+        if max_tokens <= 0:
+            return ''
+        if self.counter.count(text) <= max_tokens:
+            return text
+
+        budget = max_tokens - self.counter.count(TRUNCATION_MARK)
+        head_tokens = budget * 2 // 3
+        tail_tokens = budget - head_tokens
+        return self._prefix(text, head_tokens) + TRUNCATION_MARK + self._suffix(text, tail_tokens)
+
+    def _prefix(self, text, max_tokens):
+        lo, hi = 0, len(text)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.counter.count(text[:mid]) <= max_tokens:
+                lo = mid
+            else:
+                hi = mid - 1
+        return text[:lo]
+
+    def _suffix(self, text, max_tokens):
+        lo, hi = 0, len(text)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.counter.count(text[len(text) - mid:]) <= max_tokens:
+                lo = mid
+            else:
+                hi = mid - 1
+        return text[len(text) - lo:]
@@ -0,0 +1,294 @@
+import heapq
+import json
+import math
+import os
+import pickle
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+_WORD = re.compile(r"[a-z][a-z']+")
+STOPWORDS = frozenset(
+    "the a an of to in on at for and or but is are was were be been it this that with as by from "
+    "he she they we you i his her their our your its not do does did have has had".split()
+)
+
+
+def document_text(content, passage=None):
+    """有共用文章時把文章與題幹一起當作文件內容"""
+    return f"{passage}\n{content}" if passage else content
+
+
+def terms_for(content, options):
+    """單字 + 相鄰雙字詞"""
+    text = f"{content} {' '.join(str(v) for v in (options or {}).values())}".lower()
+    words = [w for w in _WORD.findall(text) if w not in STOPWORDS]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class SimilarQuestionIndex:
+    """TF-IDF 稀疏向量 + 反向索引，cosine 相似度以 postings 累加計算（稀疏矩陣乘向量）
+
+    新題目以當下的 IDF 增量加入；IDF 會隨題庫漂移，定期以 build_recommender 全量重建。
+    """
+
+    def __init__(self):
+        self.n_docs = 0
+        self.df = Counter()
+        self.vectors = {}   # question_id -> {term: weight}（已正規化）
+        self.postings = {}  # term -> {question_id: weight}
+        self.topics = {}
+        self._lock = threading.RLock()
+
+    def idf(self, term):
+        return math.log((1 + self.n_docs) / (1 + self.df.get(term, 0))) + 1
+
+    def _vectorize(self, terms):
+        tf = Counter(terms)
+        vector = {term: (1 + math.log(count)) * self.idf(term) for term, count in tf.items()}
+        norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+        return {term: w / norm for term, w in vector.items()}
+
+    def build(self, rows):
+        """rows: 可迭代的 (question_id, content, options, topic)"""
+        with self._lock:
+            documents = []
+            self.df = Counter()
+            for question_id, content, options, topic in rows:
+                terms = terms_for(content, options)
+                self.df.update(set(terms))
+                documents.append((question_id, terms, topic))
+            self.n_docs = len(documents)
+            self.vectors, self.postings, self.topics = {}, {}, {}
+            for question_id, terms, topic in documents:
+                self._insert(question_id, self._vectorize(terms), topic)
+
+    def _insert(self, question_id, vector, topic):
+        self.vectors[question_id] = vector
+        self.topics[question_id] = topic
+        for term, weight in vector.items():
+            self.postings.setdefault(term, {})[question_id] = weight
+
+    def upsert(self, question_id, content, options, topic):
+        with self._lock:
+            self.remove(question_id)
+            terms = terms_for(content, options)
+            self.n_docs += 1
+            self.df.update(set(terms))
+            self._insert(question_id, self._vectorize(terms), topic)
+
+    def remove(self, question_id):
+        with self._lock:
+            vector = self.vectors.pop(question_id, None)
+            if vector is None:
+                return
+            self.topics.pop(question_id, None)
+            self.n_docs -= 1
+            for term in vector:
+                docs = self.postings[term]
+                docs.pop(question_id, None)
+                if not docs:
+                    del self.postings[term]
+                self.df[term] -= 1
+                if self.df[term] <= 0:
+                    del self.df[term]
+
+    def similar(self, question_id, k=10, topic=None):
+        """回傳 [(question_id, cosine)]，不含自己"""
+        with self._lock:  # 其他執行緒可能正在套用 log
+            vector = self.vectors.get(question_id)
+            if vector is None:
+                return []
+            scores = {}
+            for term, weight in vector.items():
+                for other, other_weight in self.postings.get(term, {}).items():
+                    scores[other] = scores.get(other, 0.0) + weight * other_weight
+        scores.pop(question_id, None)
+        if topic:
+            scores = {qid: s for qid, s in scores.items() if self.topics.get(qid) == topic}
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + '.tmp')
+        with self._lock, open(tmp, 'wb') as f:
+            pickle.dump({
+                'n_docs': self.n_docs,
+                'df': self.df,
+                'vectors': self.vectors,
+                'topics': self.topics,
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+        index = cls()
+        index.n_docs = data['n_docs']
+        index.df = data['df']
+        for question_id, vector in data['vectors'].items():
+            index._insert(question_id, vector, data['topics'].get(question_id))
+        return index
+
+
+class RecommenderStore:
+    """索引快照 + 只附加的異動紀錄（delta log），各 process 共用
+
+    題目異動時 worker 只在 log 附加一行（毫秒級），各 process 在 get() 時讀取新增的行、
+    增量套用到記憶體中的索引；log 超過 compact_bytes 時才寫一次新快照並換新的 log。
+    快照（數十 MB）的重新載入在背景執行緒進行，期間請求沿用舊索引，不會被卡住。
+    """
+
+    def __init__(self, path, compact_bytes=4 * 1024 * 1024):
+        self.path = Path(path)
+        self.log_path = self.path.with_suffix(self.path.suffix + '.log')
+        self.lock_path = self.path.with_suffix(self.path.suffix + '.lock')
+        self.compact_bytes = compact_bytes
+        self._index = SimilarQuestionIndex()
+        self._snapshot_mtime = None
+        self._log_ino = None
+        self._log_offset = 0
+        self._loader = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        """快照已載入（還沒有快照檔也算）"""
+        return self._snapshot_mtime == _mtime(self.path) and self._loader is None
+
+    def get(self):
+        snapshot_mtime = _mtime(self.path)
+        if snapshot_mtime != self._snapshot_mtime and self._loader is None:
+            with self._lock:
+                if self._loader is None:
+                    self._loader = threading.Thread(target=self._load, args=(snapshot_mtime,), daemon=True)
+                    self._loader.start()
+        # 其他執行緒正在套用 log 時不等待，直接用目前的索引
+        if self._lock.acquire(blocking=False):
+            try:
+                self._tail()
+            finally:
+                self._lock.release()
+        return self._index
+
+    def get_now(self):
+        """同步載入快照並套用完整 log（worker / 管理指令使用）"""
+        with self._lock:
+            snapshot_mtime = _mtime(self.path)
+            if snapshot_mtime != self._snapshot_mtime:
+                self._swap(snapshot_mtime)
+            self._tail()
+            return self._index
+
+    def _load(self, snapshot_mtime):
+        try:
+            index = SimilarQuestionIndex.load(self.path) if snapshot_mtime else SimilarQuestionIndex()
+            with self._lock:
+                self._index = index
+                self._snapshot_mtime = snapshot_mtime
+                self._log_ino, self._log_offset = None, 0
+                self._tail()
+        finally:
+            self._loader = None
+
+    def _swap(self, snapshot_mtime):
+        self._index = SimilarQuestionIndex.load(self.path) if snapshot_mtime else SimilarQuestionIndex()
+        self._snapshot_mtime = snapshot_mtime
+        self._log_ino, self._log_offset = None, 0
+
+    def _tail(self):
+        """套用 log 中尚未讀過的完整行；log 被換新（inode 改變）時從頭讀"""
+        try:
+            stat = self.log_path.stat()
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self._log_ino:
+            self._log_ino, self._log_offset = stat.st_ino, 0
+        if stat.st_size <= self._log_offset:
+            return
+        with open(self.log_path, 'rb') as f:
+            f.seek(self._log_offset)
+            data = f.read(stat.st_size - self._log_offset)
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            entry = json.loads(line)
+            if entry['op'] == 'upsert':
+                self._index.upsert(entry['id'], entry['content'], entry['options'], entry['topic'])
+            else:
+                self._index.remove(entry['id'])
+        self._log_offset += end
+
+    def record_upsert(self, question_id, content, options, topic):
+        return self._append({'op': 'upsert', 'id': question_id, 'content': content, 'options': options, 'topic': topic})
+
+    def record_remove(self, question_id):
+        return self._append({'op': 'remove', 'id': question_id})
+
+    def _append(self, entry):
+        line = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with _file_lock(self.lock_path), open(self.log_path, 'ab') as f:
+            f.write(line)
+            return f.tell()
+
+    def compact_if_needed(self):
+        if _size(self.log_path) >= self.compact_bytes:
+            self.compact()
+
+    def compact(self):
+        """把 log 併入新快照並換一個空的 log"""
+        with _file_lock(self.lock_path):
+            index = self.get_now()
+            self._write(index)
+
+    def save(self, index):
+        """以全量重建的索引取代快照，舊的 log 一併作廢"""
+        with _file_lock(self.lock_path):
+            self._write(index)
+
+    def _write(self, index):
+        with self._lock:
+            index.save(self.path)
+            tmp = self.log_path.with_suffix('.tmp')
+            open(tmp, 'wb').close()
+            os.replace(tmp, self.log_path)  # 新 inode，其他 process 會從頭讀新 log
+            self._index = index
+            self._snapshot_mtime = _mtime(self.path)
+            self._log_ino, self._log_offset = self.log_path.stat().st_ino, 0
+
+
+def _mtime(path):
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _size(path):
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+@contextmanager
+def _file_lock(path):
+    """跨 process 的寫入鎖；沒有 fcntl 的平台（Windows）只有單一 worker 時才安全"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
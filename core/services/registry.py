@@ -0,0 +1,88 @@
+import threading
+from contextlib import contextmanager
+
+
+class ServiceRegistry:
+    """每個 process 只建立一次的服務容器
+
+    服務在第一次 get() 時才建立（連帶 import 較重的 SDK），
+    測試可用 override() 注入替身。
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._lock = threading.RLock()
+
+    def register(self, name, factory):
+        with self._lock:
+            self._factories[name] = factory
+            self._instances.pop(name, None)
+
+    def get(self, name):
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if name not in self._instances:
+                self._instances[name] = self._factories[name]()
+            return self._instances[name]
+
+    def is_initialized(self, name):
+        return name in self._instances
+
+    def set(self, name, instance):
+        with self._lock:
+            self._instances[name] = instance
+
+    @contextmanager
+    def override(self, name, instance):
+        with self._lock:
+            missing = object()
+            previous = self._instances.get(name, missing)
+            self._instances[name] = instance
+        try:
+            yield instance
+        finally:
+            with self._lock:
+                if previous is missing:
+                    self._instances.pop(name, None)
+                else:
+                    self._instances[name] = previous
+
+    def reset(self, name=None):
+        with self._lock:
+            if name is None:
+                self._instances.clear()
+            else:
+                self._instances.pop(name, None)
+
+
+def _make_gpt_client():
+    from .openai_client import get_client  # 第一次用到才載入 requests
+    return get_client()
+
+
+def _make_explanation_service():
+    from .gpt_service import GPTExplanationService
+    return GPTExplanationService(gpt_client=registry.get('gpt_client'))
+
+
+def _make_recommender_store():
+    from django.conf import settings
+    from .recommender import RecommenderStore
+    return RecommenderStore(settings.RECOMMENDER_INDEX_PATH)
+
+
+registry = ServiceRegistry()
+registry.register('gpt_client', _make_gpt_client)
+registry.register('explanation_service', _make_explanation_service)
+registry.register('recommender', _make_recommender_store)
+
+
+def get_explanation_service():
+    return registry.get('explanation_service')
+
+
+def get_recommender():
+    return registry.get('recommender').get()
@@ -0,0 +1,262 @@
+"""學生學習報告：一次掃過全部作答紀錄，依 user_id 排序串流合併，不必每人各查一次"""
+import csv
+import io
+import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+from itertools import groupby, islice
+from operator import itemgetter
+
+from .archive_service import ColumnarFile, _from_micros, get_archive
+
+MICROS_PER_DAY = 86_400_000_000
+FORMATS = ('csv', 'jsonl')
+BASE_FIELDS = ['user_id', 'username', 'tests', 'answered', 'correct', 'accuracy', 'first_activity', 'last_activity']
+
+
+def _merge_cell(cells, key, correct, total, first, last):
+    entry = cells.get(key)
+    if entry is None:
+        cells[key] = [correct, total, first, last]
+        return
+    entry[0] += correct
+    entry[1] += total
+    entry[2] = min(entry[2], first)
+    entry[3] = max(entry[3], last)
+
+
+_worker_topics = {}
+
+
+def _init_worker(topic_of):
+    global _worker_topics
+    _worker_topics = topic_of
+
+
+def _file_cells(path, topic_of=None):
+    """彙總單一封存檔：{user_id: {(topic, 'YYYY-MM'): [答對, 總數, 最早微秒, 最晚微秒]}}"""
+    topic_of = _worker_topics if topic_of is None else topic_of
+    by_user = {}
+    month_of_day = {}
+    with ColumnarFile(path) as f:
+        for user_id, question_id, is_correct, micros in zip(
+            f.column('user_id'), f.column('question_id'), f.column('is_correct'), f.column('timestamp')
+        ):
+            topic = topic_of.get(question_id)
+            if topic is None:
+                continue
+            day = micros // MICROS_PER_DAY
+            month = month_of_day.get(day)
+            if month is None:
+                month = month_of_day[day] = datetime.fromtimestamp(day * 86400, tz=dt_timezone.utc).strftime('%Y-%m')
+            cells = by_user.get(user_id)
+            if cells is None:
+                cells = by_user[user_id] = {}
+            _merge_cell(cells, (topic, month), is_correct, 1, micros, micros)
+    return by_user
+
+
+def archived_cells(archive, topic_of, workers=0):
+    """所有封存檔彙總成每位學生的格子；各檔互相獨立，workers > 0 時分給行程池
+
+    記憶體與「學生數 x 題型 x 月份」成正比，與封存列數無關。
+    """
+    paths = archive.files()
+    if workers > 0 and len(paths) > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(topic_of,))
+        with executor:
+            parts = executor.map(_file_cells, paths)
+            by_user = _merge_parts(parts)
+    else:
+        by_user = _merge_parts(_file_cells(path, topic_of) for path in paths)
+
+    # 時間先以微秒比較，最後才轉成 datetime
+    for cells in by_user.values():
+        for entry in cells.values():
+            entry[2] = _from_micros(entry[2])
+            entry[3] = _from_micros(entry[3])
+    return by_user
+
+
+def _merge_parts(parts):
+    by_user = {}
+    for part in parts:
+        for user_id, cells in part.items():
+            merged = by_user.get(user_id)
+            if merged is None:
+                by_user[user_id] = cells
+                continue
+            for key, (correct, total, first, last) in cells.items():
+                _merge_cell(merged, key, correct, total, first, last)
+    return by_user
+
+
+def _merge_join(rows):
+    """把依 key 排序的串流包成可依序查詢的游標"""
+    grouped = groupby(rows, key=itemgetter(0))
+    current = next(grouped, None)
+
+    def take(user_id):
+        nonlocal current
+        while current is not None and current[0] < user_id:
+            current = next(grouped, None)
+        if current is not None and current[0] == user_id:
+            group = list(current[1])
+            current = next(grouped, None)
+            return group
+        return []
+    return take
+
+
+def iter_raw_reports(chunk_size=2000, archive=None, workers=0):
+    """依 user_id 順序產生每位學生的原始彙總 (user_id, username, tests, cells)
+
+    資料庫端用一個 GROUP BY (user, topic, month) 的查詢算好格子，再與學生名單、
+    測驗數、封存資料依 user_id 合併；同一時間只有一位學生的資料在記憶體裡。
+    """
+    from django.db.models import CharField, Count, Max, Min, Q
+    from django.db.models.functions import Cast, Substr
+
+    from ..models import Question, TestRecord, TestSession, User
+
+    archive = archive or get_archive()
+    archived = {}
+    if archive.files():
+        topic_of = dict(Question.objects.values_list('id', 'topic').iterator(chunk_size=chunk_size))
+        archived = archived_cells(archive, topic_of, workers)
+
+    cells = (
+        TestRecord.objects.values_list('user_id', 'question__topic')
+        .annotate(
+            # 取 'YYYY-MM' 前綴；SQLite 的 TruncMonth 每列都要呼叫 Python 函式，慢好幾倍
+            month=Substr(Cast('timestamp', CharField()), 1, 7),
+            correct=Count('id', filter=Q(is_correct=True)),
+            total=Count('id'),
+            first=Min('timestamp'),
+            last=Max('timestamp'),
+        )
+        .values_list('user_id', 'question__topic', 'month', 'correct', 'total', 'first', 'last')
+        .order_by('user_id')
+    )
+    tests = (
+        TestSession.objects.filter(answered_count__gt=0)
+        .values_list('user_id')
+        .annotate(n=Count('id'))
+        .values_list('user_id', 'n')
+        .order_by('user_id')
+    )
+    take_cells = _merge_join(cells.iterator(chunk_size=chunk_size))
+    take_tests = _merge_join(tests.iterator(chunk_size=chunk_size))
+
+    students = User.objects.filter(role='student').order_by('id').values_list('id', 'username')
+    for user_id, username in students.iterator(chunk_size=chunk_size):
+        merged = archived.pop(user_id, {})
+        for _, topic, month, correct, total, first, last in take_cells(user_id):
+            _merge_cell(merged, (topic, month), correct, total, first, last)
+        test_rows = take_tests(user_id)
+        tests_taken = test_rows[0][1] if test_rows else 0
+        yield user_id, username, tests_taken, [(*key, *value) for key, value in merged.items()]
+
+
+def build_report(raw, weak_threshold=60, weak_min_answers=5):
+    """原始彙總 -> 報告 dict（純函式，可在子行程執行）"""
+    user_id, username, tests_taken, cells = raw
+    topics = {}
+    months = {}
+    first = last = None
+    for topic, month, correct, total, cell_first, cell_last in cells:
+        for bucket, key in ((topics, topic), (months, month)):
+            entry = bucket.setdefault(key, [0, 0])
+            entry[0] += correct
+            entry[1] += total
+        first = cell_first if first is None else min(first, cell_first)
+        last = cell_last if last is None else max(last, cell_last)
+
+    def accuracy(correct, total):
+        return round(correct / total * 100, 2) if total else 0
+
+    answered = sum(total for _, total in topics.values())
+    correct = sum(c for c, _ in topics.values())
+    return {
+        'user_id': user_id,
+        'username': username,
+        'tests': tests_taken,
+        'answered': answered,
+        'correct': correct,
+        'accuracy': accuracy(correct, answered),
+        'first_activity': first.isoformat() if first else None,
+        'last_activity': last.isoformat() if last else None,
+        'topics': {t: {'answered': n, 'accuracy': accuracy(c, n)} for t, (c, n) in sorted(topics.items())},
+        'weak_topics': sorted(
+            t for t, (c, n) in topics.items() if n >= weak_min_answers and accuracy(c, n) < weak_threshold
+        ),
+        'monthly': [{'month': m, 'answered': n, 'accuracy': accuracy(c, n)} for m, (c, n) in sorted(months.items())],
+    }
+
+
+def csv_header(topics):
+    header = list(BASE_FIELDS)
+    for topic in topics:
+        header += [f'{topic}_answered', f'{topic}_accuracy']
+    return header + ['weak_topics', 'monthly']
+
+
+def render_chunk(fmt, topics, raws, weak_threshold=60, weak_min_answers=5):
+    """把一批原始彙總轉成 CSV 或 JSONL 文字"""
+    out = io.StringIO()
+    writer = csv.writer(out) if fmt == 'csv' else None
+    for raw in raws:
+        report = build_report(raw, weak_threshold, weak_min_answers)
+        if writer is None:
+            out.write(json.dumps(report, ensure_ascii=False))
+            out.write('\n')
+            continue
+        row = [report[field] for field in BASE_FIELDS]
+        for topic in topics:
+            stats = report['topics'].get(topic)
+            row += [stats['answered'], stats['accuracy']] if stats else [0, '']
+        row.append('|'.join(report['weak_topics']))
+        row.append(';'.join(f"{m['month']}:{m['accuracy']}/{m['answered']}" for m in report['monthly']))
+        writer.writerow(row)
+    return out.getvalue()
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def export_reports(fmt='csv', workers=0, batch_size=500, chunk_size=2000, header=True):
+    """產生報告文字片段；workers > 0 時封存檔彙總與轉檔交給行程池，在途批次有上限以控制記憶體"""
+    if fmt not in FORMATS:
+        raise ValueError(f"不支援的格式：{fmt}")
+
+    from ..models import Question
+    from ..tasks import WEAK_TOPIC_MIN_ANSWERS, WEAK_TOPIC_THRESHOLD
+
+    topics = sorted(Question.objects.values_list('topic', flat=True).distinct())
+    if fmt == 'csv' and header:
+        out = io.StringIO()
+        csv.writer(out).writerow(csv_header(topics))
+        yield out.getvalue()
+
+    batches = _batches(iter_raw_reports(chunk_size=chunk_size, workers=workers), batch_size)
+    args = (WEAK_TOPIC_THRESHOLD, WEAK_TOPIC_MIN_ANSWERS)
+    if workers <= 0:
+        for batch in batches:
+            yield render_chunk(fmt, topics, batch, *args)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for batch in batches:
+            pending.append(executor.submit(render_chunk, fmt, topics, batch, *args))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
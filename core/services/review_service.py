@@ -0,0 +1,49 @@
+from dataclasses import dataclass
+from datetime import timedelta
+
+
+# SM-2 參數：答對視為品質 4、答錯視為品質 1
+QUALITY_CORRECT = 4
+QUALITY_WRONG = 1
+MIN_EASE = 1.3
+DEFAULT_EASE = 2.5
+
+
+@dataclass
+class ReviewState:
+    interval_days: int = 0
+    ease_factor: float = DEFAULT_EASE
+    repetitions: int = 0
+    lapses: int = 0
+
+
+class ReviewScheduler:
+    """SM-2 間隔複習排程，只做純計算，不碰資料庫"""
+
+    def next_state(self, state, is_correct):
+        quality = QUALITY_CORRECT if is_correct else QUALITY_WRONG
+
+        if quality >= 3:
+            if state.repetitions == 0:
+                interval = 1
+            elif state.repetitions == 1:
+                interval = 6
+            else:
+                interval = round(state.interval_days * state.ease_factor)
+            repetitions = state.repetitions + 1
+            lapses = state.lapses
+        else:
+            interval = 1
+            repetitions = 0
+            lapses = state.lapses + 1
+
+        ease = state.ease_factor + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)
+        return ReviewState(
+            interval_days=interval,
+            ease_factor=max(MIN_EASE, ease),
+            repetitions=repetitions,
+            lapses=lapses,
+        )
+
+    def due_at(self, reviewed_at, state):
+        return reviewed_at + timedelta(days=state.interval_days)
@@ -0,0 +1,246 @@
+import math
+import re
+import threading
+from collections import Counter
+
+from django.db import connection, transaction
+
+FTS_TABLE = 'core_question_fts'
+
+# 備援索引的斷詞：英數字詞、中文逐字
+_TOKEN = re.compile(r"[^\W_]+", re.UNICODE)
+_CJK_RUN = re.compile(r'[\u3400-\u9fff]+')
+
+
+def tokenize(text):
+    tokens = []
+    for word in _TOKEN.findall(str(text or '').lower()):
+        if _CJK_RUN.fullmatch(word):
+            tokens.extend(word)
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def question_fields(question):
+    """回傳要索引的 (content, options) 文字；共用文章也一併索引"""
+    options = question.options or {}
+    options_text = " ".join(str(v) for v in options.values()) if isinstance(options, dict) else str(options)
+    content = question.content or ''
+    if question.passage_id:
+        content = f"{question.passage.content}\n{content}"
+    return content, options_text
+
+
+def fts5_available():
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x)")
+            cursor.execute("DROP TABLE temp._fts5_probe")
+            return True
+        except Exception:
+            return False
+
+
+class FTSQuestionIndex:
+    """SQLite FTS5 虛擬表，以 rowid 對應 Question.id，依 BM25 排序"""
+
+    def __init__(self, content_weight=2.0, options_weight=1.0):
+        self.weights = (content_weight, options_weight)
+
+    def create_table(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "content, options, topic UNINDEXED, is_gpt UNINDEXED, tokenize='unicode61')"
+        )
+
+    def upsert(self, question):
+        content, options_text = question_fields(question)
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [question.id])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, content, options, topic, is_gpt) VALUES (%s, %s, %s, %s, %s)",
+                [question.id, content, options_text, question.topic, int(question.is_gpt_generated)],
+            )
+
+    def delete(self, question_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [question_id])
+
+    def rebuild(self, questions, chunk_size=1000):
+        # 包在同一個 transaction，避免每一列各自 commit
+        with transaction.atomic(), connection.cursor() as cursor:
+            self.create_table(cursor)
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            batch = []
+            for question in questions.iterator(chunk_size=chunk_size):
+                content, options_text = question_fields(question)
+                batch.append((question.id, content, options_text, question.topic, int(question.is_gpt_generated)))
+                if len(batch) >= chunk_size:
+                    self._insert_many(cursor, batch)
+                    batch = []
+            if batch:
+                self._insert_many(cursor, batch)
+
+    def _insert_many(self, cursor, rows):
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, content, options, topic, is_gpt) VALUES (%s, %s, %s, %s, %s)",
+            rows,
+        )
+
+    def search(self, query, topic=None, is_gpt=None, limit=20, offset=0):
+        match = self._match_expression(query)
+        if not match:
+            return []
+        sql = (
+            f"SELECT rowid, bm25({FTS_TABLE}, %s, %s) AS score FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s"
+        )
+        params = [*self.weights, match]
+        if topic:
+            sql += " AND topic = %s"
+            params.append(topic)
+        if is_gpt is not None:
+            sql += " AND is_gpt = %s"
+            params.append(int(is_gpt))
+        sql += " ORDER BY score LIMIT %s OFFSET %s"
+        params += [limit, offset]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            # FTS5 的 bm25() 越小越相關，轉成正分數
+            return [(row[0], -row[1]) for row in cursor.fetchall()]
+
+    def _match_expression(self, query):
+        """把使用者輸入轉成安全的 FTS5 查詢：每個詞加引號（AND），最後一個詞做前綴比對"""
+        words = _TOKEN.findall(str(query or ''))
+        if not words:
+            return None
+        terms = [f'"{w}"' for w in words]
+        terms[-1] += '*'
+        return " ".join(terms)
+
+
+class InvertedQuestionIndex:
+    """沒有 FTS5 時的純 Python 反向索引，同樣以 BM25 排序"""
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}  # token -> {question_id: tf}
+        self.doc_len = {}
+        self.doc_terms = {}
+        self.meta = {}  # question_id -> (topic, is_gpt)
+        self.total_len = 0
+        self.loaded = False
+        self._lock = threading.RLock()
+
+    def _ensure_loaded(self):
+        if not self.loaded:
+            from core.models import Question
+            self.rebuild(
+                Question.objects.select_related('passage')
+                .only('id', 'content', 'options', 'topic', 'is_gpt_generated', 'passage__content')
+            )
+
+    def upsert(self, question):
+        with self._lock:
+            if not self.loaded:
+                return  # 第一次搜尋時會從資料庫完整建立
+            self._remove(question.id)
+            self._add(question)
+
+    def delete(self, question_id):
+        with self._lock:
+            if self.loaded:
+                self._remove(question_id)
+
+    def rebuild(self, questions, chunk_size=1000):
+        with self._lock:
+            self.postings, self.doc_len, self.doc_terms, self.meta, self.total_len = {}, {}, {}, {}, 0
+            for question in questions.iterator(chunk_size=chunk_size):
+                self._add(question)
+            self.loaded = True
+
+    def _add(self, question):
+        tokens = tokenize(" ".join(question_fields(question)))
+        counts = Counter(tokens)
+        for token, tf in counts.items():
+            self.postings.setdefault(token, {})[question.id] = tf
+        self.doc_terms[question.id] = tuple(counts)
+        self.doc_len[question.id] = len(tokens)
+        self.total_len += len(tokens)
+        self.meta[question.id] = (question.topic, bool(question.is_gpt_generated))
+
+    def _remove(self, question_id):
+        if question_id not in self.doc_len:
+            return
+        for token in self.doc_terms.pop(question_id):
+            docs = self.postings[token]
+            docs.pop(question_id, None)
+            if not docs:
+                del self.postings[token]
+        self.total_len -= self.doc_len.pop(question_id)
+        self.meta.pop(question_id, None)
+
+    def search(self, query, topic=None, is_gpt=None, limit=20, offset=0):
+        with self._lock:
+            self._ensure_loaded()
+            terms = tokenize(query)
+            if not terms or not self.doc_len:
+                return []
+
+            *exact, last = terms
+            postings = [self.postings.get(t, {}) for t in exact]
+            # 最後一個詞做前綴比對，與 FTS5 行為一致
+            prefix = {}
+            for token, docs in self.postings.items():
+                if token.startswith(last):
+                    for qid, tf in docs.items():
+                        prefix[qid] = prefix.get(qid, 0) + tf
+            postings.append(prefix)
+
+            candidates = set(min(postings, key=len))
+            for docs in postings:
+                candidates &= docs.keys()
+
+            n = len(self.doc_len)
+            avg_len = self.total_len / n
+            scores = []
+            for qid in candidates:
+                q_topic, q_gpt = self.meta[qid]
+                if (topic and q_topic != topic) or (is_gpt is not None and q_gpt != bool(is_gpt)):
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[qid] / avg_len)
+                score = 0.0
+                for docs in postings:
+                    tf = docs[qid]
+                    idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                    score += idf * tf * (self.k1 + 1) / (tf + norm)
+                scores.append((qid, score))
+
+            scores.sort(key=lambda item: -item[1])
+            return scores[offset:offset + limit]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_search_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = FTSQuestionIndex() if fts5_available() else InvertedQuestionIndex()
+    return _index
+
+
+def search_questions(query, topic=None, is_gpt=None, limit=20, offset=0):
+    """回傳依相關度排序的 [(Question, score)]"""
+    from core.models import Question
+
+    hits = get_search_index().search(query, topic=topic, is_gpt=is_gpt, limit=limit, offset=offset)
+    questions = Question.objects.in_bulk([qid for qid, _ in hits])
+    return [(questions[qid], score) for qid, score in hits if qid in questions]
@@ -0,0 +1,141 @@
+import logging
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from core.models import Task
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def task(name):
+    """註冊背景工作處理函式：@task('generate_explanation')"""
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def get_handler(name):
+    return _registry.get(name)
+
+
+def enqueue(name, payload=None, dedup_key='', max_attempts=3):
+    """加入一筆工作；若相同 dedup_key 的工作還在等待中，直接回傳那一筆
+
+    只跟 pending 去重：running 的工作已讀過輸入，之後的異動要另排一筆才不會遺失。
+    """
+    for attempt in range(3):
+        if dedup_key:
+            existing = Task.objects.filter(dedup_key=dedup_key, status='pending').first()
+            if existing:
+                return existing
+        try:
+            with transaction.atomic():
+                return Task.objects.create(
+                    name=name,
+                    payload=payload or {},
+                    dedup_key=dedup_key,
+                    max_attempts=max_attempts,
+                )
+        except IntegrityError:
+            # 與另一個請求同時加入同一件工作；對方若在這之間已完成，下一輪會重新建立
+            if attempt == 2:
+                raise
+
+
+class TaskWorker:
+    """從資料表領取工作並交給執行緒池處理"""
+
+    def __init__(self, workers=4, batch_size=20, retry_backoff=2, names=None):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.retry_backoff = retry_backoff
+        self.names = names  # 只領取這些名稱的工作；None 表示全部
+
+    def release_stale(self, timeout_seconds=600):
+        """worker 中途結束時，把卡在 running 的工作放回佇列"""
+        cutoff = timezone.now() - timedelta(seconds=timeout_seconds)
+        released = 0
+        for job in self._filter(Task.objects.filter(status='running', updated_at__lt=cutoff)):
+            if self._superseded(job):
+                job.status = 'failed'
+                job.error = "中斷後已有同 dedup_key 的新工作等待執行"
+            else:
+                job.status = 'pending'
+                released += 1
+            job.save(update_fields=['status', 'error', 'updated_at'])
+        return released
+
+    def _filter(self, qs):
+        return qs if self.names is None else qs.filter(name__in=self.names)
+
+    @staticmethod
+    def _superseded(job):
+        """同 dedup_key 已有新的 pending 工作時，舊的不再重排（唯一約束也不允許）"""
+        return bool(job.dedup_key) and Task.objects.filter(
+            dedup_key=job.dedup_key, status='pending'
+        ).exclude(id=job.id).exists()
+
+    def claim_batch(self):
+        candidate_ids = list(
+            self._filter(Task.objects.filter(status='pending', run_after__lte=timezone.now()))
+            .order_by('id')
+            .values_list('id', flat=True)[:self.batch_size]
+        )
+        claimed = []
+        for task_id in candidate_ids:
+            # 條件式 UPDATE 作為鎖：只有一個 worker 能把 pending 改成 running
+            if Task.objects.filter(id=task_id, status='pending').update(status='running', updated_at=timezone.now()):
+                claimed.append(task_id)
+        return claimed
+
+    def run_task(self, task_id):
+        close_old_connections()
+        try:
+            job = Task.objects.get(id=task_id)
+            handler = get_handler(job.name)
+            job.attempts += 1
+            try:
+                if handler is None:
+                    raise LookupError(f"未註冊的工作：{job.name}")
+                job.result = handler(**job.payload)
+                job.status = 'done'
+                job.error = ''
+            except Exception:
+                job.error = traceback.format_exc()
+                if job.attempts < job.max_attempts and not self._superseded(job):
+                    job.status = 'pending'
+                    job.run_after = timezone.now() + timedelta(seconds=self.retry_backoff ** job.attempts)
+                else:
+                    job.status = 'failed'
+                logger.warning("task %s #%s attempt %s failed", job.name, job.id, job.attempts)
+            job.save()
+            return job.status
+        finally:
+            close_old_connections()
+
+    def run_once(self, executor):
+        """領取一批工作並等待完成，回傳處理筆數"""
+        claimed = self.claim_batch()
+        if claimed:
+            list(executor.map(self.run_task, claimed))
+        return len(claimed)
+
+    def run(self, poll_interval=1.0, stop_when_empty=False):
+        processed = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                count = self.run_once(executor)
+                processed += count
+                if count:
+                    continue
+                if stop_when_empty:
+                    return processed
+                time.sleep(poll_interval)
@@ -0,0 +1,42 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import ExamPaper, Passage, Question
+from .services.search_service import get_search_index
+from .services.task_queue import enqueue
+
+
+@receiver(post_save, sender=Question)
+def index_question(sender, instance, **kwargs):
+    get_search_index().upsert(instance)
+    # 相似題索引較大，交給 worker 更新
+    enqueue('recommender_upsert', {'question_id': instance.id}, dedup_key=f'recommend:{instance.id}')
+
+
+@receiver(post_delete, sender=Question)
+def unindex_question(sender, instance, **kwargs):
+    get_search_index().delete(instance.id)
+    enqueue('recommender_remove', {'question_id': instance.id}, dedup_key=f'recommend-remove:{instance.id}')
+
+
+@receiver(post_save, sender=Passage)
+def reindex_passage_questions(sender, instance, created, **kwargs):
+    """文章內容會被索引進每一題，修改文章時重建相關題目的索引"""
+    if created:
+        return
+    for question in instance.questions.select_related('passage'):
+        index_question(Question, question)
+
+
+@receiver(post_save, sender=ExamPaper)
+def refresh_exam_paper_cache(sender, instance, **kwargs):
+    """發布中的考卷更新快取，取消發布就移除，避免快取過期前還能開考"""
+    if instance.is_published:
+        instance.warm_cache()
+    else:
+        instance.clear_cache()
+
+
+@receiver(post_delete, sender=ExamPaper)
+def drop_exam_paper_cache(sender, instance, **kwargs):
+    instance.clear_cache()
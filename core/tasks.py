@@ -0,0 +1,91 @@
+from django.db.models import Count, Q, Sum
+
+from .models import ArchivedAnswerStat, Explanation, Question, TestRecord, WeakTopic
+from .services.recommender import document_text
+from .services.registry import get_explanation_service, registry
+from .services.task_queue import task
+
+# 正確率低於此值（%）的題型視為弱項
+WEAK_TOPIC_THRESHOLD = 60
+# 題數太少時不下判斷
+WEAK_TOPIC_MIN_ANSWERS = 5
+
+
+@task('generate_explanation')
+def generate_explanation(question_id):
+    """產生並保存單題 GPT 詳解"""
+    if Explanation.objects.filter(question_id=question_id).exists():
+        return {'question_id': question_id, 'cached': True}
+
+    question = Question.objects.select_related('passage').get(id=question_id)
+    result = get_explanation_service().explain(
+        question.content, question.answer, question.options,
+        topic=question.topic,
+        passage=question.passage.content if question.passage_id else None,
+    )
+    if not result.ok:
+        raise RuntimeError(f"{result.error_type}: {result.error}")  # 交給佇列重試，不把錯誤訊息存成詳解
+
+    Explanation.objects.update_or_create(question=question, defaults={'explanation_text': result.text})
+    return {'question_id': question_id, 'cached': False}
+
+
+@task('diagnose_weak_topics')
+def diagnose_weak_topics(user_id):
+    """統計各題型正確率並更新使用者弱項"""
+    rows = (
+        TestRecord.objects.filter(user_id=user_id)
+        .values('question__topic')
+        .annotate(total=Count('id'), correct=Count('id', filter=Q(is_correct=True)))
+    )
+    counts = {row['question__topic']: [row['correct'], row['total']] for row in rows}
+
+    # 合併已封存的歷史紀錄：封存時已按題彙總，只讀該使用者的列
+    archived = (
+        ArchivedAnswerStat.objects.filter(user_id=user_id)
+        .values('question__topic')
+        .annotate(total=Sum('total'), correct=Sum('correct'))
+    )
+    for row in archived:
+        entry = counts.setdefault(row['question__topic'], [0, 0])
+        entry[0] += row['correct']
+        entry[1] += row['total']
+
+    stats = {}
+    weak = []
+    for topic, (correct, total) in counts.items():
+        accuracy = correct / total * 100
+        stats[topic] = {'total': total, 'accuracy': round(accuracy, 2)}
+        if total >= WEAK_TOPIC_MIN_ANSWERS and accuracy < WEAK_TOPIC_THRESHOLD:
+            weak.append(topic)
+
+    WeakTopic.objects.filter(user_id=user_id).exclude(topic__in=weak).delete()
+    for topic in weak:
+        WeakTopic.objects.update_or_create(user_id=user_id, topic=topic)
+    return {'weak_topics': weak, 'stats': stats}
+
+
+@task('recommender_upsert')
+def recommender_upsert(question_id):
+    """新增或修改題目後，在相似題索引的 delta log 附加一筆異動"""
+    store = registry.get('recommender')
+    question = (
+        Question.objects.filter(id=question_id)
+        .values_list('content', 'passage__content', 'options', 'topic')
+        .first()
+    )
+    if question is None:
+        store.record_remove(question_id)
+    else:
+        content, passage, options, topic = question
+        store.record_upsert(question_id, document_text(content, passage), options, topic)
+    store.compact_if_needed()
+    return {'question_id': question_id}
+
+
+@task('recommender_remove')
+def recommender_remove(question_id):
+    store = registry.get('recommender')
+    store.record_remove(question_id)
+    store.compact_if_needed()
+    return {'question_id': question_id}
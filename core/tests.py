@@ -1,3 +1,338 @@
-from django.test import TestCase
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.contrib import admin
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from .models import ArchivedAnswerStat, ExamPaper, Favorite, Question, ReviewSchedule, TestRecord, User
+from .services.archive_service import ColumnarWriter, RecordArchive
+from .services.fake_openai import FakeOpenAIServer
+from .services.openai_client import CircuitBreaker, OpenAIClient
+from .services.review_service import MIN_EASE, ReviewScheduler, ReviewState
+
+
+class OpenAIClientTests(SimpleTestCase):
+    """以本機假伺服器測試重試、退避與斷路器"""
+
+    def make_client(self, server, **kwargs):
+        kwargs.setdefault('backoff_base', 0)
+        return OpenAIClient(api_key='test', base_url=server.base_url, timeout=2, **kwargs)
+
+    def test_retries_then_succeeds(self):
+        with FakeOpenAIServer(fail_first=2, reply="詳解") as server:
+            result = self.make_client(server, max_retries=2).complete("題目")
+        self.assertTrue(result.ok)
+        self.assertEqual(result.text, "詳解")
+        self.assertEqual(result.attempts, 3)
+        self.assertEqual(server.requests, 3)
+
+    def test_gives_up_after_max_retries(self):
+        with FakeOpenAIServer(fail_first=10) as server:
+            client = self.make_client(server, max_retries=1)
+            result = client.complete("題目")
+        self.assertFalse(result.ok)
+        self.assertEqual(result.error_type, 'server')
+        self.assertEqual(result.attempts, 2)
+        self.assertEqual(server.requests, 2)
+        self.assertEqual(client.breaker.failures, 1)
+
+    def test_backoff_sleeps_between_attempts(self):
+        with FakeOpenAIServer(fail_first=2) as server:
+            client = self.make_client(server, max_retries=2, backoff_base=0.5, backoff_max=8)
+            with mock.patch('core.services.openai_client.time.sleep') as sleep:
+                result = client.complete("題目")
+        self.assertTrue(result.ok)
+        delays = [call.args[0] for call in sleep.call_args_list]
+        self.assertEqual(len(delays), 2)
+        self.assertTrue(0 <= delays[0] <= 0.5)
+        self.assertTrue(0 <= delays[1] <= 1.0)
+
+    def test_backoff_is_capped_and_honours_retry_after(self):
+        client = OpenAIClient(api_key='test', backoff_base=1, backoff_max=4)
+        for attempt in range(1, 8):
+            self.assertLessEqual(client._backoff(attempt), 4)
+        self.assertGreaterEqual(client._backoff(1, retry_after=3), 3)
+        self.assertLessEqual(client._backoff(1, retry_after=60), 4)
+
+    def test_breaker_opens_after_threshold(self):
+        with FakeOpenAIServer(fail_first=100) as server:
+            client = self.make_client(server, max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+            client.complete("題目")
+            client.complete("題目")
+            result = client.complete("題目")
+        self.assertEqual(client.breaker.state, 'open')
+        self.assertEqual(result.error_type, 'circuit_open')
+        self.assertEqual(server.requests, 2)  # 斷路後不再送出請求
+
+    def test_half_open_probe_closes_on_success(self):
+        with FakeOpenAIServer(fail_first=1) as server:
+            client = self.make_client(server, max_retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.1))
+            self.assertFalse(client.complete("題目").ok)
+            self.assertEqual(client.breaker.state, 'open')
+            time.sleep(0.15)
+            self.assertEqual(client.breaker.state, 'half_open')
+            self.assertTrue(client.complete("題目").ok)
+        self.assertEqual(client.breaker.state, 'closed')
+
+    def test_half_open_probe_reopens_on_failure(self):
+        with FakeOpenAIServer(fail_first=2) as server:
+            client = self.make_client(server, max_retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.1))
+            client.complete("題目")
+            time.sleep(0.15)
+            self.assertFalse(client.complete("題目").ok)
+            self.assertEqual(client.breaker.state, 'open')
+            self.assertEqual(client.complete("題目").error_type, 'circuit_open')
+        self.assertEqual(server.requests, 2)
+
+    def test_non_json_body_is_retried_as_server_error(self):
+        with FakeOpenAIServer(raw_body="<html>Bad Gateway</html>") as server:
+            client = self.make_client(server, max_retries=1)
+            result = client.complete("題目")
+        self.assertFalse(result.ok)
+        self.assertEqual(result.error_type, 'server')
+        self.assertEqual(server.requests, 2)
+        self.assertEqual(client.breaker.failures, 1)
+
+    def test_client_error_is_not_retried_or_counted(self):
+        with FakeOpenAIServer(fail_first=1, fail_status=400) as server:
+            client = self.make_client(server, max_retries=2)
+            result = client.complete("題目")
+        self.assertFalse(result.ok)
+        self.assertEqual(result.error_type, 'http')
+        self.assertEqual(result.attempts, 1)
+        self.assertEqual(server.requests, 1)
+        self.assertEqual(client.breaker.failures, 0)
+        self.assertEqual(client.breaker.state, 'closed')
+
+
+class ReviewSchedulerTests(SimpleTestCase):
+    def setUp(self):
+        self.scheduler = ReviewScheduler()
+
+    def test_correct_answers_grow_interval(self):
+        state = self.scheduler.next_state(ReviewState(), True)
+        self.assertEqual((state.interval_days, state.repetitions), (1, 1))
+        state = self.scheduler.next_state(state, True)
+        self.assertEqual((state.interval_days, state.repetitions), (6, 2))
+        ease = state.ease_factor
+        state = self.scheduler.next_state(state, True)
+        self.assertEqual(state.interval_days, round(6 * ease))
+        self.assertEqual(state.repetitions, 3)
+        self.assertEqual(state.lapses, 0)
+
+    def test_wrong_answer_resets_and_counts_lapse(self):
+        state = ReviewState(interval_days=15, ease_factor=2.5, repetitions=3, lapses=1)
+        state = self.scheduler.next_state(state, False)
+        self.assertEqual((state.interval_days, state.repetitions, state.lapses), (1, 0, 2))
+        self.assertLess(state.ease_factor, 2.5)
+
+    def test_ease_never_drops_below_minimum(self):
+        state = ReviewState()
+        for _ in range(20):
+            state = self.scheduler.next_state(state, False)
+        self.assertEqual(state.ease_factor, MIN_EASE)
+
+    def test_due_at_adds_interval(self):
+        reviewed_at = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+        self.assertEqual(self.scheduler.due_at(reviewed_at, ReviewState(interval_days=6)), reviewed_at + timedelta(days=6))
+
+
+def _question(topic='grammar', answer='A'):
+    return Question.objects.create(
+        content=f"{topic} 題目", options={'A': 'a', 'B': 'b', 'C': 'c', 'D': 'd'}, answer=answer, topic=topic,
+    )
+
+
+class RecomputeReviewsTests(TestCase):
+    """重算結果要和作答當下即時更新的排程一致"""
+
+    def setUp(self):
+        self.archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.archive_dir.cleanup)
+        settings_override = override_settings(RECORD_ARCHIVE_DIR=self.archive_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.create('student1', 'pw')
+        self.questions = [_question() for _ in range(4)]
+
+    def answer(self, question, correct, test_result_id='t1'):
+        TestRecord.save_answer(self.user.id, question, 'A' if correct else 'B', test_result_id)
+
+    def snapshot(self):
+        return {
+            row.question_id: (row.interval_days, round(row.ease_factor, 6), row.repetitions, row.lapses)
+            for row in ReviewSchedule.objects.filter(user=self.user)
+        }
+
+    def play(self):
+        q1, q2, q3, q4 = self.questions
+        self.answer(q1, False, 't1')
+        self.answer(q2, True, 't1')  # 答對且沒收藏：不排程
+        Favorite.toggle_star(self.user.id, q3.id)
+        self.answer(q3, True, 't1')  # 收藏後答對：推進排程
+        self.answer(q1, True, 't2')
+        self.answer(q1, True, 't3')
+        Favorite.toggle_star(self.user.id, q4.id)  # 只收藏沒作答
+
+    def test_recompute_matches_live(self):
+        self.play()
+        live = self.snapshot()
+        self.assertEqual(set(live), {self.questions[0].id, self.questions[2].id, self.questions[3].id})
+
+        call_command('recompute_reviews', stdout=mock.MagicMock())
+        self.assertEqual(self.snapshot(), live)
+
+    def test_recompute_includes_archived_records(self):
+        self.play()
+        live = self.snapshot()
+
+        call_command('archive_records', older_than=-1, stdout=mock.MagicMock())
+        self.assertFalse(TestRecord.objects.exists())
+        call_command('recompute_reviews', stdout=mock.MagicMock())
+        self.assertEqual(self.snapshot(), live)
+
+    def test_unstar_keeps_lapsed_schedule(self):
+        q1, q2 = self.questions[:2]
+        Favorite.toggle_star(self.user.id, q1.id)
+        Favorite.toggle_star(self.user.id, q2.id)
+        self.answer(q2, False)
+        Favorite.toggle_star(self.user.id, q1.id)
+        Favorite.toggle_star(self.user.id, q2.id)
+        self.assertEqual(set(self.snapshot()), {q2.id})
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.archive = RecordArchive(self.tmp.name)
+
+    def test_round_trip(self):
+        base = datetime(2026, 3, 1, 8, 30, 15, 123456, tzinfo=dt_timezone.utc)
+        rows = [
+            (1, 7, 100, True, 'A', base, 'r1'),
+            (2, 7, 101, False, '中', base + timedelta(seconds=5), 'r1'),  # 作答值不保證是 A-D
+            (3, 8, 100, False, '', base + timedelta(minutes=1), 'r2'),
+        ]
+        ColumnarWriter().write(self.archive.partition_path(2026, 3, 1), rows)
+
+        restored = list(self.archive.iter_records())
+        self.assertEqual(
+            [tuple(r[k] for k in ('id', 'user_id', 'question_id', 'is_correct', 'selected_option', 'timestamp', 'test_result_id'))
+             for r in restored],
+            rows,
+        )
+        self.assertEqual([r['id'] for r in self.archive.iter_records(user_id=8)], [3])
+        self.assertEqual(self.archive.item_stats(user_id=7), {100: [1, 1], 101: [0, 1]})
+
+    def test_iter_sorted_merges_files_by_user_and_time(self):
+        base = datetime(2026, 3, 1, tzinfo=dt_timezone.utc)
+        writer = ColumnarWriter()
+        writer.write(self.archive.partition_path(2026, 3, 1), [
+            (1, 9, 1, True, 'A', base + timedelta(hours=2), 'r1'),
+            (2, 5, 1, True, 'A', base + timedelta(hours=3), 'r1'),
+        ])
+        writer.write(self.archive.partition_path(2026, 4, 3), [
+            (3, 5, 2, False, 'B', base + timedelta(hours=1), 'r2'),
+        ])
+        order = [(user_id, question_id) for user_id, _, question_id, _ in self.archive.iter_sorted()]
+        self.assertEqual(order, [(5, 2), (5, 1), (9, 1)])
+
+    def test_archive_records_keeps_accuracy(self):
+        with override_settings(RECORD_ARCHIVE_DIR=self.tmp.name):
+            user = User.create('student1', 'pw')
+            q1, q2 = _question(), _question()
+            TestRecord.save_answer(user.id, q1, 'A', 't1')
+            TestRecord.save_answer(user.id, q2, 'B', 't1')
+            TestRecord.save_answer(user.id, q2, 'A', 't2')
+            before = TestRecord.get_accuracy(user.id)
+
+            call_command('archive_records', older_than=-1, stdout=mock.MagicMock())
+            self.assertFalse(TestRecord.objects.exists())
+            self.assertEqual(TestRecord.get_accuracy(user.id), before)
+            self.assertEqual(
+                ArchivedAnswerStat.objects.get(user=user, question=q2).total, 2,
+            )
+
+            # 重建彙總結果相同
+            call_command('archive_records', rebuild_stats=True, stdout=mock.MagicMock())
+            self.assertEqual(TestRecord.get_accuracy(user.id), before)
+
+
+class ExamPaperCacheTests(TestCase):
+    def setUp(self):
+        for _ in range(3):
+            _question()
+        self.paper = ExamPaper.objects.create(title="小考", topic='grammar', count=2)
+        self.paper.publish()
+
+    def test_publish_warms_cache(self):
+        with self.assertNumQueries(0):
+            snapshot = ExamPaper.get_cached(self.paper.id)
+        self.assertEqual(snapshot['version'], 1)
+        self.assertEqual(len(snapshot['question_ids']), 2)
+
+    def test_unpublish_and_delete_drop_cache(self):
+        self.paper.unpublish()
+        self.assertIsNone(ExamPaper.get_cached(self.paper.id))
+
+        self.paper.publish()
+        self.assertIsNotNone(ExamPaper.get_cached(self.paper.id))
+        paper_id = self.paper.id
+        self.paper.delete()
+        self.assertIsNone(ExamPaper.get_cached(paper_id))
+
+
+class QuestionAdminSearchTests(TestCase):
+    def setUp(self):
+        for topic, gpt in [('grammar', False), ('grammar', True), ('vocab', False), ('vocab', True)]:
+            question = _question(topic)
+            question.content = "apple tree"
+            question.is_gpt_generated = gpt
+            question.save()
+        self.model_admin = admin.site._registry[Question]
+
+    def results(self, **params):
+        request = RequestFactory().get('/admin/core/question/', params)
+        queryset, _ = self.model_admin.get_search_results(request, Question.objects.all(), 'apple')
+        return sorted(queryset.values_list('topic', 'is_gpt_generated'))
+
+    def test_sidebar_filters_are_passed_to_index(self):
+        self.assertEqual(len(self.results()), 4)
+        self.assertEqual(self.results(topic='vocab'), [('vocab', False), ('vocab', True)])
+        with mock.patch('core.admin.get_search_index') as get_index:
+            get_index.return_value.search.return_value = []
+            self.results(topic='vocab', is_gpt_generated__exact='0')
+        get_index.return_value.search.assert_called_once_with('apple', topic='vocab', is_gpt=False, limit=1000)
+
+
+class DirectoryPageTests(TestCase):
+    def setUp(self):
+        for name in ['amy', 'anna', 'bob', 'ben', 'carl', 'alice']:
+            User.create(name, 'pw')
+        User.objects.create(username='admin1', password='pw', role='admin')
+
+    def collect(self, **kwargs):
+        names, after = [], None
+        while True:
+            rows, after = User.directory_page(after=after, page_size=2, **kwargs)
+            names.extend(u.username for u in rows)
+            if after is None:
+                return names
+
+    def test_pages_cover_all_users_in_order(self):
+        names = self.collect()
+        self.assertEqual(names, sorted(User.objects.values_list('username', flat=True)))
+
+    def test_prefix_and_role(self):
+        self.assertEqual(self.collect(prefix='a'), ['admin1', 'alice', 'amy', 'anna'])
+        self.assertEqual(self.collect(prefix='a', role='student'), ['alice', 'amy', 'anna'])
+
+    def test_last_full_page_has_no_next(self):
+        rows, after = User.directory_page(prefix='b', page_size=2)
+        self.assertEqual([u.username for u in rows], ['ben', 'bob'])
+        self.assertIsNone(after)
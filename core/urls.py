@@ -4,20 +4,30 @@ from . import views
 from .views import test_result_view
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
     path('', views.login_view, name='login'),
     path('dashboard/', views.dashboard_view, name='dashboard'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('register/', views.register_view, name='register'),
     path('admin/users/', views.user_management_view, name='user_management'),
+    path('admin/users/export/', views.user_export_view, name='user_export'),
+    path('admin/reports/export/', views.report_export_view, name='report_export'),
+    path('admin/profiles/', views.profiles_view, name='profiles'),
+    path('admin/profiles/<str:name>/', views.profiles_view, name='profile_download'),
     path('start-test/', views.start_test_view, name='start_test'),
+    path('exam/<int:paper_id>/', views.exam_start_view, name='exam_start'),
+    path('practice-similar/<int:question_id>/', views.practice_similar_view, name='practice_similar'),
     path('test/<int:question_index>/', views.test_question_view, name='test_question'),
     path('test/result/', test_result_view, name='test_result'),
+    path('test/history/', views.test_history_view, name='test_history'),
     path('api/save-answer/', views.save_answer_view, name='save_answer'),
     path('gpt/', views.gpt_detail_view, name='gpt_detail'),
     path('gpt/manual/', views.home, name='gpt_manual'),
     path('api/toggle-star/', views.toggle_star_view, name='toggle_star'),
+    path('api/feedback/', views.feedback_batch_view, name='feedback_batch'),
+    path('api/questions/search/', views.question_search_api, name='question_search'),
     path('wrong-note/<int:fav_id>/', views.update_note_view, name='update_note'),
     path('wrong-questions/', views.wrong_questions_view, name='wrong_questions'),
+    # 放在自訂的 admin/... 路徑之後，否則會被 admin 的 catch-all 攔截
+    path('admin/', admin.site.urls),
 ]
@@ -1,19 +1,28 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+from django.middleware.csrf import get_token
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
-from .services.gpt_service import GPTExplanationService
-from .services.openai_client import OpenAIClient
+from django.conf import settings
+from django.core.cache import cache
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+from django.utils.http import url_has_allowed_host_and_scheme
+from .services.registry import get_explanation_service, get_recommender, registry
 from .services.auth_service import AuthService
-from .models import User, Favorite, Question, TestRecord
-from dotenv import load_dotenv
+from .services.task_queue import enqueue
+from .services.search_service import search_questions
+from .services.profiling import list_profiles
+from .models import User, Favorite, Question, TestRecord, ReviewSchedule, Explanation, ExamPaper, TestSession, Feedback
+import hashlib
 import json
+import logging
 import random
-import os
 
 
-load_dotenv()  # 讀取 .env 檔案
+logger = logging.getLogger(__name__)
 
 auth_service = AuthService()
 
@@ -23,16 +32,18 @@ def home(request):
         return redirect('login')
 
     explanation = None
+    error = None
     if request.method == 'POST':
         question = request.POST.get('question')
         answer = request.POST.get('answer')
 
-        import os
-        client = OpenAIClient(api_key=os.getenv("OPENAI_API_KEY"))
-        service = GPTExplanationService(gpt_client=client)
-        explanation = service.explain(question, answer)
+        result = get_explanation_service().explain(question, answer)
+        if result.ok:
+            explanation = result.text
+        else:
+            error = result.error
 
-    return render(request, 'home.html', {'explanation': explanation})
+    return render(request, 'home.html', {'explanation': explanation, 'error': error})
 
 
 def register_view(request):
@@ -66,12 +77,23 @@ def logout_view(request):
     return redirect('login')  # 登出後導回首頁登入
 
 
+DASHBOARD_CACHE_SECONDS = 60 * 5
+
+
+@cache_control(private=True, max_age=DASHBOARD_CACHE_SECONDS)
+@vary_on_cookie
 def dashboard_view(request):
     user_id = request.session.get('user_id')
     if not user_id:
         return redirect('login')
 
-    return render(request, 'dashboard.html')
+    # 以 user_id 為鍵快取渲染結果；cache_page 不會儲存 Cache-Control: private 的回應
+    key = f'dashboard:{user_id}'
+    content = cache.get(key)
+    if content is None:
+        content = render(request, 'dashboard.html').content
+        cache.set(key, content, DASHBOARD_CACHE_SECONDS)
+    return HttpResponse(content)
 
 
 def start_test_view(request):
@@ -100,23 +122,165 @@ def start_test_view(request):
             'include_gpt': include_gpt
         }
 
-        # 題庫篩選
-        qs = Question.objects.filter(topic=topic)
-        if include_gpt == 'no':
-            qs = qs.filter(is_gpt_generated=False)
-
-        # 隨機選題
-        selected = random.sample(list(qs), min(count, qs.count()))
+        if mode == 'review':
+            # 複習模式：只讀 (user, due_at) 索引上到期的題目
+            question_ids = ReviewSchedule.get_due_question_ids(user_id, count, topic=topic)
+            if not question_ids:
+                messages.info(request, "目前沒有到期需要複習的題目。")
+                return redirect('start_test')
+        else:
+            # 題庫篩選（排除評分過低而被隱藏的 GPT 題）
+            qs = Question.objects.filter(topic=topic).exclude(quality__hidden=True)
+            if include_gpt == 'no':
+                qs = qs.filter(is_gpt_generated=False)
+
+            # 隨機選題
+            selected = random.sample(list(qs), min(count, qs.count()))
+            # 共用同一篇文章的題目排在一起
+            question_ids = Question.group_by_passage(
+                [q.id for q in selected], {q.id: q.passage_id for q in selected if q.passage_id}
+            )
 
         # 存進 session
-        request.session['test_questions'] = [q.id for q in selected]
+        request.session['test_questions'] = question_ids
         request.session['answers'] = {}
+        TestSession.start(user_id, test_result_id, request.session['test_config'], len(question_ids))
 
         return redirect('test_question', question_index=0)
 
     return render(request, 'start_test.html')
 
 
+def exam_start_view(request, paper_id):
+    user_id = request.session.get('user_id')
+    if not user_id:
+        return redirect('login')
+
+    # 考卷事先組好並放在快取，開考瞬間大量學生湧入時不查題庫
+    exam = ExamPaper.get_cached(paper_id)
+    if exam is None:
+        raise Http404("考卷不存在或尚未發布")
+
+    if request.method == 'POST':
+        import uuid
+        request.session['test_result_id'] = str(uuid.uuid4())
+        request.session['test_config'] = {
+            'topic': None,
+            'count': len(exam['question_ids']),
+            'mode': 'exam',
+            'include_gpt': None,
+            'exam_id': exam['id'],
+            'exam_version': exam['version'],
+        }
+        request.session['test_questions'] = ExamPaper.shuffled_for(exam, user_id)
+        request.session['answers'] = {}
+        TestSession.start(user_id, request.session['test_result_id'], request.session['test_config'],
+                          len(exam['question_ids']))
+        return redirect('test_question', question_index=0)
+
+    return render(request, 'exam_start.html', {'exam': exam, 'total': len(exam['question_ids'])})
+
+
+def practice_similar_view(request, question_id):
+    """以某題為起點，用相似題組一份練習"""
+    user_id = request.session.get('user_id')
+    if not user_id:
+        return redirect('login')
+    if request.method != 'POST':
+        return redirect('dashboard')
+
+    count = int(request.POST.get('count', 5))
+    question_ids = [qid for qid, _ in get_recommender().similar(question_id, k=count)]
+    # 索引可能還沒包含剛刪除的題目
+    existing = set(
+        Question.objects.filter(id__in=question_ids).exclude(quality__hidden=True).values_list('id', flat=True)
+    )
+    question_ids = [qid for qid in question_ids if qid in existing]
+    if not question_ids:
+        if not registry.get('recommender').ready:
+            messages.info(request, "相似題索引載入中，請稍後再試。")
+        else:
+            messages.info(request, "目前找不到相似的題目。")
+        return redirect('start_test')
+
+    import uuid
+    test_result_id = str(uuid.uuid4())
+    request.session['test_result_id'] = test_result_id
+    request.session['test_config'] = {
+        'topic': None,
+        'count': len(question_ids),
+        'mode': 'similar',
+        'include_gpt': None,
+        'source_question': question_id,
+    }
+    request.session['test_questions'] = question_ids
+    request.session['answers'] = {}
+    TestSession.start(user_id, test_result_id, request.session['test_config'], len(question_ids))
+    return redirect('test_question', question_index=0)
+
+
+def _make_etag(*parts):
+    return hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()
+
+
+def _csrf_secret(request):
+    """頁面內含 CSRF token，ETag 要跟著 CSRF secret 變；
+    第一次造訪還沒有 cookie，先用 get_token 產生本次回應會設定的 secret，第二次請求就能 304"""
+    get_token(request)
+    return request.META.get('CSRF_COOKIE', '')
+
+
+def _question_page_version(request, question_index):
+    """回傳 (etag, last_modified)；只有 GET 且能確定題目時才做條件式回應"""
+    if not hasattr(request, '_page_version'):
+        request._page_version = (None, None)
+        question_ids = request.session.get('test_questions')
+        if (request.method == 'GET' and request.session.get('test_config')
+                and question_ids and question_index < len(question_ids)):
+            qid = question_ids[question_index]
+            row = Question.objects.filter(id=qid).values_list('updated_at', 'passage__updated_at').first()
+            if row:
+                updated_at, passage_updated_at = row
+                previous = question_ids[question_index - 1] if question_index else ''
+                request._page_version = (
+                    _make_etag('question', qid, updated_at.isoformat(), passage_updated_at, question_index,
+                               len(question_ids), previous, _csrf_secret(request)),
+                    max(filter(None, row)),
+                )
+    return request._page_version
+
+
+def _gpt_detail_version(request):
+    """依題目版本、詳解時間與本人的作答/收藏狀態產生版本；詳解尚未產生時不快取"""
+    if not hasattr(request, '_page_version'):
+        request._page_version = (None, None)
+        qid = request.GET.get('qid', '')
+        if request.method == 'GET' and qid.isdigit():
+            qid = int(qid)
+            row = (
+                Question.objects.filter(id=qid)
+                .values_list('updated_at', 'explanation__updated_at', 'passage__updated_at')
+                .first()
+            )
+            if row and row[1]:
+                user_id = request.session.get('user_id')
+                is_starred = Favorite.objects.filter(user_id=user_id, question_id=qid).exists()
+                selected = request.session.get('answers', {}).get(str(qid))
+                test_questions = request.session.get('test_questions', [])
+                request._page_version = (
+                    _make_etag('gpt', qid, row[0].isoformat(), row[1].isoformat(), row[2], is_starred, selected,
+                               test_questions, _csrf_secret(request)),
+                    max(filter(None, row)),
+                )
+    return request._page_version
+
+
+@cache_control(private=True, no_cache=True)
+@vary_on_cookie
+@condition(
+    etag_func=lambda request, question_index: _question_page_version(request, question_index)[0],
+    last_modified_func=lambda request, question_index: _question_page_version(request, question_index)[1],
+)
 def test_question_view(request, question_index):
     config = request.session.get('test_config')
     if not config:
@@ -137,7 +301,7 @@ def test_question_view(request, question_index):
     selected_answer = None
     if request.method == 'POST':
         selected_answer = request.POST.get('answer')
-        question = Question.objects.get(id=question_ids[question_index])
+        question = Question.objects.select_related('passage').get(id=question_ids[question_index])
         answers = request.session.get('answers', {})
         answers[str(question.id)] = selected_answer
         request.session['answers'] = answers
@@ -145,22 +309,27 @@ def test_question_view(request, question_index):
         user_id = request.session.get('user_id')
         test_result_id = request.session.get('test_result_id')
 
-        print("user_id:", user_id)
-        print("test_result_id:", test_result_id)
-        print("selected:", selected_answer)
+        logger.debug("save answer user_id=%s test_result_id=%s selected=%s", user_id, test_result_id, selected_answer)
 
         if user_id and test_result_id:
             TestRecord.save_answer(user_id, question, selected_answer, test_result_id)
 
 
     else:
-        question = Question.objects.get(id=question_ids[question_index])
+        question = Question.objects.select_related('passage').get(id=question_ids[question_index])
+
+    # 同一篇文章只在該組第一題完整展開，後面的題目預設收合
+    passage_first = True
+    if question.passage_id and question_index:
+        previous = Question.objects.filter(id=question_ids[question_index - 1]).values_list('passage_id', flat=True).first()
+        passage_first = previous != question.passage_id
 
     return render(request, 'test_question.html', {
         'question': question,
         'index': question_index,
         'total': len(question_ids),
-        'selected': selected_answer
+        'selected': selected_answer,
+        'passage_first': passage_first,
     })
 
 
@@ -178,7 +347,7 @@ def test_result_view(request):
     total = records.count()
     correct_count = records.filter(is_correct=True).count()
     accuracy = round((correct_count / total) * 100, 2) if total else 0
-    wrong_records = records.filter(is_correct=False)
+    wrong_records = records.filter(is_correct=False).select_related('question__passage')
 
 
     # 排序：依照這次測驗的 test_questions 順序
@@ -197,6 +366,11 @@ def test_result_view(request):
         })
 
 
+    TestSession.finish(user_id, test_result_id)
+
+    # 背景更新弱項診斷
+    enqueue('diagnose_weak_topics', {'user_id': user_id}, dedup_key=f'diagnose:{user_id}')
+
     # 清掉本輪測驗的 ID，避免誤用
     request.session.pop('test_result_id', None)
 
@@ -208,10 +382,29 @@ def test_result_view(request):
     })
 
 
+def test_history_view(request):
+    user_id = request.session.get('user_id')
+    if not user_id:
+        return redirect('login')
+
+    before = request.GET.get('before')
+    sessions, next_before = TestSession.history_page(user_id, before=int(before) if before and before.isdigit() else None)
+    return render(request, 'test_history.html', {
+        'sessions': sessions,
+        'next_before': next_before,
+    })
+
+
+@cache_control(private=True, no_cache=True)
+@vary_on_cookie
+@condition(
+    etag_func=lambda request: _gpt_detail_version(request)[0],
+    last_modified_func=lambda request: _gpt_detail_version(request)[1],
+)
 def gpt_detail_view(request):
     user_id = request.session.get('user_id')
     qid = int(request.GET.get('qid'))
-    question = Question.objects.get(id=qid)
+    question = Question.objects.select_related('passage').get(id=qid)
 
     # 查詢是否已收藏
     is_starred = Favorite.objects.filter(user_id=user_id, question=question).exists()
@@ -228,14 +421,10 @@ def gpt_detail_view(request):
     answers = request.session.get('answers', {})
     selected = answers.get(str(qid))
 
-    # GPT 解釋
-    client = OpenAIClient(api_key=os.getenv("OPENAI_API_KEY"))
-    service = GPTExplanationService(gpt_client=client)
-    explanation = service.explain(
-        question.content,
-        question.answer,
-        question.options
-    )
+    # GPT 解釋：已有詳解直接讀取，否則交給背景 worker 產生
+    explanation = Explanation.objects.filter(question=question).values_list('explanation_text', flat=True).first()
+    if explanation is None:
+        enqueue('generate_explanation', {'question_id': qid}, dedup_key=f'explain:{qid}')
 
     return render(request, 'gpt_detail.html', {
         'question': question,
@@ -252,31 +441,113 @@ def logout_view(request):
     return redirect('login')
 
 
-def user_management_view(request):
+USER_PAGE_SIZE = 50
+
+
+def _require_admin(request):
+    """回傳 (current_user, 錯誤回應)"""
     user_id = request.session.get('user_id')
     if not user_id:
-        return redirect('login')
+        return None, redirect('login')
+    current_user = User.objects.filter(id=user_id).only('id', 'role').first()
+    if current_user is None or current_user.role != 'admin':
+        return None, HttpResponseForbidden("你沒有權限瀏覽此頁面")
+    return current_user, None
 
-    current_user = User.objects.get(id=user_id)
-    if current_user.role != 'admin':
-        return HttpResponseForbidden("你沒有權限瀏覽此頁面")
+
+def user_management_view(request):
+    current_user, error = _require_admin(request)
+    if error:
+        return error
 
     if request.method == 'POST':
-        target_id = request.POST.get('user_id')
+        # 支援勾選多位使用者一次更新，也相容舊的單筆表單
+        target_ids = request.POST.getlist('user_ids') or [request.POST.get('user_id')]
+        target_ids = [int(t) for t in target_ids if t and t.isdigit()]
         new_role = request.POST.get('role')
-
-        if str(current_user.id) == target_id:
+        back = request.POST.get('next')
+        # 只接受本站路徑，避免被當成 open redirect
+        if not back or not url_has_allowed_host_and_scheme(back, allowed_hosts={request.get_host()},
+                                                           require_https=request.is_secure()):
+            back = 'user_management'
+
+        if new_role not in dict(User.ROLE_CHOICES):
+            messages.error(request, "角色不正確。")
+            return redirect(back)
+        if current_user.id in target_ids:
             messages.error(request, "無法修改自己的權限。")
-            return redirect('user_management')
+            target_ids.remove(current_user.id)
+
+        updated = User.objects.filter(id__in=target_ids).update(role=new_role)
+        if updated:
+            messages.success(request, f"已將 {updated} 位使用者更新為 {new_role}。")
+        return redirect(back)
+
+    users, next_after = User.directory_page(
+        prefix=request.GET.get('q', '').strip(),
+        role=request.GET.get('role') or None,
+        after=request.GET.get('after') or None,
+        page_size=USER_PAGE_SIZE,
+    )
+    return render(request, 'user_management.html', {
+        'users': users,
+        'next_after': next_after,
+        'q': request.GET.get('q', ''),
+        'role': request.GET.get('role', ''),
+    })
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
 
-        target_user = User.objects.get(id=target_id)
-        target_user.role = new_role
-        target_user.save()
-        messages.success(request, f"使用者 {target_user.username} 已更新為 {new_role}。")
-        return redirect('user_management')
+def user_export_view(request):
+    """以串流輸出全部使用者 CSV，不一次載入記憶體"""
+    current_user, error = _require_admin(request)
+    if error:
+        return error
 
-    users = User.objects.all()
-    return render(request, 'user_management.html', {'users': users})
+    import csv
+    from django.http import StreamingHttpResponse
+
+    writer = csv.writer(_Echo())
+    rows = User.objects.order_by('id').values_list('id', 'username', 'role').iterator(chunk_size=2000)
+
+    def stream():
+        yield '\ufeff'  # 讓 Excel 以 UTF-8 開啟
+        yield writer.writerow(['id', 'username', 'role'])
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(stream(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="users.csv"'
+    return response
+
+
+def report_export_view(request):
+    """串流輸出全部學生的學習報告（CSV 或 JSONL），邊算邊送"""
+    current_user, error = _require_admin(request)
+    if error:
+        return error
+
+    from django.http import StreamingHttpResponse
+    from .services.report_service import FORMATS, export_reports
+
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATS:
+        return HttpResponse(status=400)
+
+    def stream():
+        if fmt == 'csv':
+            yield '\ufeff'  # 讓 Excel 以 UTF-8 開啟
+        # web 行程內不開 worker 行程池，需要時改用 export_reports 指令
+        yield from export_reports(fmt=fmt)
+
+    content_type = 'text/csv; charset=utf-8' if fmt == 'csv' else 'application/x-ndjson; charset=utf-8'
+    response = StreamingHttpResponse(stream(), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="reports.{fmt}"'
+    return response
 
 
 @csrf_exempt
@@ -311,16 +582,8 @@ def toggle_star_view(request):
             qid = data.get('qid')
             question = Question.objects.get(id=qid)
 
-            favorite, created = Favorite.objects.get_or_create(
-                user_id=user_id,
-                question=question
-            )
-
-            if not created:
-                favorite.delete()
-                return JsonResponse({'starred': False})
-            else:
-                return JsonResponse({'starred': True})
+            starred = Favorite.toggle_star(user_id, question.id)
+            return JsonResponse({'starred': starred})
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=400)
     return JsonResponse({'error': 'invalid method'}, status=405)
@@ -341,3 +604,91 @@ def wrong_questions_view(request):
     favorites = Favorite.get_user_favorites(user_id)  # 呼叫封裝好的方法
     return render(request, 'wrong_questions.html', {'favorites': favorites})
 
+
+
+def question_search_api(request):
+    """題庫全文搜尋（管理員）：/api/questions/search/?q=...&topic=...&gpt=yes|no"""
+    user_id = request.session.get('user_id')
+    if not user_id or not User.objects.filter(id=user_id, role='admin').exists():
+        return JsonResponse({'error': 'forbidden'}, status=403)
+
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'error': 'missing q'}, status=400)
+
+    gpt = request.GET.get('gpt')
+    is_gpt = {'yes': True, 'no': False}.get(gpt)
+    try:
+        limit = min(int(request.GET.get('limit', 20)), 100)
+        offset = max(int(request.GET.get('offset', 0)), 0)
+    except ValueError:
+        return JsonResponse({'error': 'invalid limit/offset'}, status=400)
+
+    hits = search_questions(query, topic=request.GET.get('topic') or None, is_gpt=is_gpt, limit=limit, offset=offset)
+    return JsonResponse({
+        'results': [
+            {
+                'id': question.id,
+                'content': question.content,
+                'options': question.options,
+                'topic': question.topic,
+                'is_gpt_generated': question.is_gpt_generated,
+                'score': round(score, 4),
+            }
+            for question, score in hits
+        ],
+    })
+
+
+def profiles_view(request, name=None):
+    """管理員瀏覽 profiling 結果；帶 name 時下載 collapsed stack 檔"""
+    user_id = request.session.get('user_id')
+    if not user_id:
+        return redirect('login')
+    if not User.objects.filter(id=user_id, role='admin').exists():
+        return HttpResponseForbidden("你沒有權限瀏覽此頁面")
+
+    if name:
+        path = settings.PROFILING_DIR / f"{name}.collapsed"
+        if '/' in name or '..' in name or not path.exists():
+            raise Http404("找不到 profile")
+        response = HttpResponse(path.read_text(encoding='utf-8'), content_type='text/plain; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{name}.collapsed"'
+        return response
+
+    return render(request, 'profiles.html', {
+        'profiles': list_profiles(settings.PROFILING_DIR),
+        'enabled': settings.PROFILING_ENABLED,
+    })
+
+
+FEEDBACK_BATCH_LIMIT = 500
+
+
+@csrf_exempt
+def feedback_batch_view(request):
+    """批次送出題目評分：{"ratings": [{"qid": 1, "rating": 4, "comment": "..."}, ...]}"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'invalid method'}, status=405)
+    user_id = request.session.get('user_id')
+    if not user_id:
+        return JsonResponse({'error': 'login required'}, status=401)
+
+    try:
+        ratings = json.loads(request.body).get('ratings', [])
+        items = []
+        for item in ratings:
+            rating = int(item['rating'])
+            if not Feedback.MIN_RATING <= rating <= Feedback.MAX_RATING:
+                raise ValueError(f"rating 需介於 {Feedback.MIN_RATING}-{Feedback.MAX_RATING}")
+            items.append((int(item['qid']), rating, str(item.get('comment', ''))[:1000]))
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        return JsonResponse({'error': str(e) or 'invalid payload'}, status=400)
+
+    if len(items) > FEEDBACK_BATCH_LIMIT:
+        return JsonResponse({'error': f'最多 {FEEDBACK_BATCH_LIMIT} 筆'}, status=400)
+
+    valid_ids = set(Question.objects.filter(id__in={qid for qid, _, _ in items}).values_list('id', flat=True))
+    unknown = sorted({qid for qid, _, _ in items} - valid_ids)
+    created, updated = Feedback.submit_batch(user_id, [item for item in items if item[0] in valid_ids])
+    return JsonResponse({'created': created, 'updated': updated, 'unknown_questions': unknown})